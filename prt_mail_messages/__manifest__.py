@@ -43,6 +43,7 @@ Forward messages, Edit messages, Delete messages, Move messages, Quote messages
         "views/cetmix_conversation_views.xml",
         "views/res_partner_views.xml",
         "views/cx_model_reference_views.xml",
+        "views/cetmix_conversation_queue_views.xml",
         "views/res_config_settings_views.xml",
         "report/mail_message_paperformat.xml",
         "report/mail_message_report.xml",
@@ -1,6 +1,9 @@
 from . import base
 from . import mail_message
+from . import mail_notification
+from . import message_inbox
 from . import conversation
+from . import conversation_queue
 from . import mail_thread
 from . import res_partner
 from . import res_config_settings
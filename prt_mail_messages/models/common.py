@@ -24,6 +24,30 @@ IMAGE_PLACEHOLDER = "iVBORw0KGgoAAAANSUhEUgAAAQAAAAEACAYAAABccqhmAAAgAElEQVR4nO1
 # Number of symbols to show as a message preview in TreeView
 DEFAULT_MESSAGE_PREVIEW_LENGTH = 200
 
+# Used as avatar when rendering image links and author is not defined
+AVATAR_PLACEHOLDER_URL = "/base/static/img/avatar_grey.png"
+
+# Number of conversations processed at once by batch operations
+CONVERSATION_BATCH_SIZE = 1000
+
+# Message types that are not counted as Conversation messages
+CONVERSATION_EXCLUDED_MESSAGE_TYPES = ["notification", "user_notification"]
+
+# Number of messages processed at once by batch operations
+MESSAGE_BATCH_SIZE = 1000
+
+# Number of trashed messages deleted at once by the empty trash cron
+TRASH_PURGE_BATCH_SIZE = 1000
+
+# Share of the cron time limit the empty trash cron may use
+TRASH_PURGE_TIME_LIMIT_RATIO = 0.8
+
+# Number of queued inbound Conversation emails processed at once
+CONVERSATION_QUEUE_BATCH_SIZE = 100
+
+# Number of attempts to process queued inbound Conversation email
+CONVERSATION_QUEUE_MAX_ATTEMPTS = 3
+
 # Used to render dates in html TreeView
 MONTHS = {
     1: _("Jan"),
@@ -40,11 +64,8 @@ MONTHS = {
     12: _("Dec"),
 }
 
-# List of forbidden models
-FORBIDDEN_MODELS = ["mail.channel", "mail.message"]
-
-# Search for 'ghost' models is performed
-GHOSTS_CHECKED = False
+# Models messages of which are never shown in Messages Easy
+FORBIDDEN_MODELS = ["discuss.channel", "mail.channel", "mail.message"]
 
 # Used to render html field in TreeView
 TREE_TEMPLATE = (
@@ -52,7 +73,7 @@ TREE_TEMPLATE = (
     "<tbody>"
     "<tr>"
     '<td style="width: 1%%;"><img class="rounded-circle"'
-    ' style="width: 64px; padding:10px;" src="data:image/png;base64,%(avatar)s"'
+    ' style="width: 64px; padding:10px;" src="%(avatar)s"'
     ' alt="Avatar" title="%(author_display)s" width="100" border="0" /></td>'
     '<td style="width: 99%%;">'
     '<table style="width: 100%%; border: none;">'
@@ -95,7 +116,7 @@ CONVERSATION_TREE_TEMPLATE = (
     "<tr>"
     '<td style="width: 1%%;"><img class="rounded-circle" '
     'style="height: auto; width: 64px; padding:10px;"'
-    ' src="data:image/png;base64, %(avatar)s" alt="Avatar" '
+    ' src="%(avatar)s" alt="Avatar" '
     'title="%(title)s" width="100" border="0" /></td>'
     '<td style="width: 99%%;">'
     '<table style="width: 100%%; border: none;">'
@@ -122,15 +143,39 @@ CONVERSATION_TREE_TEMPLATE = (
 PARTICIPANT_IMG = (
     '<img class="rounded-circle"'
     ' style="width:24px;max-height:24px;margin:2px;"'
-    ' title="%(title)s" src="data:image/png;base64, %(img)s"/>'
+    ' title="%(title)s" src="%(img)s"/>'
 )
 
 PLAIN_BODY = (
     '<img class="rounded-circle"'
     ' style="width:16px;max-height:16px;margin:2px;"'
-    ' title="%(title)s" src="data:image/png;base64, %(img)s"/>'
+    ' title="%(title)s" src="%(img)s"/>'
     ' <span id="text-preview"'
     ' style="color:#808080;vertical-align:middle;">%(body)s</p>'
 )
 
 DEFAULT_SIGNATURE_LOCATION = "a"
+
+# PostgreSQL text search configuration used by default for full-text search
+DEFAULT_SEARCH_LANGUAGE = "simple"
+
+# Settings stored in configuration parameters: {key: (type, default value)}
+CETMIX_SETTINGS = {
+    "cetmix.allow_direct_messages_to_catchall": (bool, False),
+    "cetmix.conversation_deferred_processing": (bool, False),
+    "cetmix.conversation_deferred_batch_size": (int, CONVERSATION_QUEUE_BATCH_SIZE),
+    "cetmix.conversation_deferred_max_attempts": (
+        int,
+        CONVERSATION_QUEUE_MAX_ATTEMPTS,
+    ),
+    "cetmix.conversation_last_message_postcommit": (bool, False),
+    "cetmix.mail_incoming_smart_notify": (bool, False),
+    "cetmix.message_quote_number": (int, 0),
+    "cetmix.message_signature_location": (str, DEFAULT_SIGNATURE_LOCATION),
+    "cetmix.messages_easy_avatar_url": (bool, False),
+    "cetmix.messages_easy_color_note": (str, False),
+    "cetmix.messages_easy_empty_trash": (int, 0),
+    "cetmix.messages_easy_empty_trash_batch_size": (int, TRASH_PURGE_BATCH_SIZE),
+    "cetmix.messages_easy_search_language": (str, DEFAULT_SEARCH_LANGUAGE),
+    "cetmix.messages_easy_text_preview": (int, False),
+}
@@ -17,16 +17,35 @@
 #
 ###################################################################################
 
-from odoo import _, api, fields, models, tools
+from collections import defaultdict
+
+from odoo import SUPERUSER_ID, _, api, fields, models, tools
+from odoo.tools import split_every
 
 from .common import (
     CONVERSATION_TREE_TEMPLATE as TREE_TEMPLATE,
 )
 from .common import (
+    CONVERSATION_BATCH_SIZE,
+    CONVERSATION_EXCLUDED_MESSAGE_TYPES,
     PARTICIPANT_IMG,
     PLAIN_BODY,
 )
-from .tools import _get_decode_image, _prepare_date_display, sanitize_name
+from .tools import (
+    _get_avatar_srcs,
+    _prepare_date_display,
+    sanitize_name,
+)
+
+# Stored fields computed from Conversation messages.
+# Mail Message marks them to recompute when messages are changed.
+MESSAGE_COMPUTED_FIELDS = (
+    "message_count",
+    "last_message_id",
+    "last_message_author_id",
+    "last_message_preview",
+    "subject_display_cache",
+)
 
 
 ################
@@ -63,15 +82,51 @@ class Conversation(models.Model):
     is_participant = fields.Boolean(
         string="I participate", compute="_compute_is_participant"
     )
+    last_message_id = fields.Many2one(
+        string="Last Message",
+        comodel_name="mail.message",
+        compute="_compute_last_message",
+        compute_sudo=True,
+        store=True,
+        index="btree_not_null",
+        help="Latest message except for notifications. "
+        "Kept up to date by Mail Message and recomputed by cron",
+    )
+    last_message_author_id = fields.Many2one(
+        string="Last Message Author",
+        comodel_name="res.partner",
+        compute="_compute_last_message",
+        compute_sudo=True,
+        store=True,
+    )
+    last_message_preview = fields.Char(
+        compute="_compute_last_message",
+        compute_sudo=True,
+        store=True,
+    )
 
     subject_display = fields.Html(
         string="Subject", compute="_compute_subject_display", compute_sudo=True
     )
+    subject_display_cache = fields.Json(
+        compute="_compute_subject_display_cache",
+        compute_sudo=True,
+        store=True,
+        help="User independent parts of the Tree View "
+        "(participants and last message preview)",
+    )
     message_count = fields.Integer(
-        string="Messages", compute="_compute_message_count", compute_sudo=True
+        string="Messages",
+        compute="_compute_message_count",
+        compute_sudo=True,
+        store=True,
+        help="Number of messages except for notifications. "
+        "Kept up to date by Mail Message and recomputed by cron",
     )
     message_needaction_count = fields.Integer(
-        string="Messages", compute="_compute_message_count", compute_sudo=True
+        string="Messages",
+        compute="_compute_message_needaction_count",
+        compute_sudo=True,
     )
 
     def name_get(self):
@@ -80,29 +135,255 @@ class Conversation(models.Model):
             return super().name_get()
         return [(rec.id, f"{rec.name} - {rec.author_id.name}") for rec in self]
 
-    @api.depends("message_ids")
+    def _count_messages(self, domain=None):
+        """
+        Count messages of conversations with a single grouped query.
+        All messages except for notifications are counted
+        :param list domain: extra domain for messages
+        :return: dict {conversation_id: count}
+        """
+        conversation_ids = self._origin.ids
+        if not conversation_ids:
+            return {}
+        message_domain = [
+            ("model", "=", self._name),
+            ("res_id", "in", conversation_ids),
+            ("message_type", "not in", CONVERSATION_EXCLUDED_MESSAGE_TYPES),
+        ]
+        return dict(
+            self.env["mail.message"]._read_group(
+                message_domain + (domain or []),
+                groupby=["res_id"],
+                aggregates=["__count"],
+            )
+        )
+
     def _compute_message_count(self):
         """
         Compute count messages.
-        All messages except for notifications are counted
+        No dependencies are declared because messages are linked
+        by 'res_id' only. Mail Message marks the counter to recompute
+        (see '_recompute_message_fields') whenever conversation messages
+        are created, archived, moved or deleted.
         """
+        message_counts = self._count_messages()
         for rec in self:
-            message_ids = rec.message_ids.filtered(
-                lambda msg: msg.message_type != "notification"
-            )
-            message_needaction = message_ids.filtered(lambda msg: msg.needaction)
-            rec.update(
-                {
-                    "message_count": len(message_ids),
-                    "message_needaction_count": len(message_needaction),
+            rec.message_count = message_counts.get(rec._origin.id, 0)
+
+    def _compute_last_message(self):
+        """
+        Compute last message with its author and preview.
+        Last messages of all conversations are found with a single
+         grouped query. Dependencies are not declared for the same reason
+         as for 'message_count' (see '_compute_message_count')
+        """
+        MailMessage = self.env["mail.message"]
+        conversation_ids = self._origin.ids
+        last_message_ids = []
+        if conversation_ids:
+            last_message_ids = [
+                message_id
+                for __, message_id in MailMessage._read_group(
+                    [
+                        ("model", "=", self._name),
+                        ("res_id", "in", conversation_ids),
+                        ("message_type", "not in", CONVERSATION_EXCLUDED_MESSAGE_TYPES),
+                    ],
+                    groupby=["res_id"],
+                    aggregates=["id:max"],
+                )
+            ]
+        last_messages = {
+            message.res_id: message for message in MailMessage.browse(last_message_ids)
+        }
+        for rec in self:
+            message = last_messages.get(rec._origin.id, MailMessage)
+            rec.last_message_id = message
+            rec.last_message_author_id = message.author_id
+            rec.last_message_preview = message.preview
+
+    def _compute_message_needaction_count(self):
+        """
+        Compute count of messages awaiting action of the current user.
+        Depends on the current user so it cannot be stored
+        """
+        needaction_counts = self._count_messages([("needaction", "=", True)])
+        for rec in self:
+            rec.message_needaction_count = needaction_counts.get(rec._origin.id, 0)
+
+    def _recompute_message_fields(self):
+        """Mark fields computed from messages to be recomputed on the next flush"""
+        if not self:
+            return
+        for field_name in MESSAGE_COMPUTED_FIELDS:
+            self.env.add_to_compute(self._fields[field_name], self)
+
+    @api.model
+    def _cron_recompute_message_fields(self):
+        """
+        Recompute message counters and Tree View cache
+         of all conversations to fix possible drift
+        :return: True always
+        """
+        conversation_ids = self.with_context(active_test=False).search([]).ids
+        for batch_ids in split_every(CONVERSATION_BATCH_SIZE, conversation_ids):
+            conversations = self.browse(batch_ids)
+            conversations._recompute_message_fields()
+            conversations.flush_recordset(list(MESSAGE_COMPUTED_FIELDS))
+            conversations.invalidate_recordset()
+        return True
+
+    @api.model
+    def _update_last_message(self, last_messages):
+        """
+        Update last message date and author of Conversations
+         with a single query.
+        Updates are monotonic: older date never overwrites a newer one.
+        :param dict last_messages: {conversation_id: (date, author_id)}
+        :return: None
+        """
+        if not last_messages:
+            return
+        fnames = ["last_message_post", "last_message_by", "write_date", "write_uid"]
+        self.flush_model(fnames)
+        values = [
+            (conversation_id, date, author_id)
+            for conversation_id, (date, author_id) in last_messages.items()
+        ]
+        # Fields are not tracked, so bypassing 'write' loses no history
+        self._cr.execute(
+            """ UPDATE cetmix_conversation AS cc
+                SET last_message_post = v.date, last_message_by = v.author_id,
+                    write_date = now() at time zone 'UTC', write_uid = %s
+                FROM (VALUES %s) AS v (id, date, author_id)
+                WHERE cc.id = v.id
+                AND (cc.last_message_post IS NULL
+                    OR cc.last_message_post <= v.date) """
+            % ("%s", ", ".join(["(%s, %s::timestamp, %s)"] * len(values))),
+            [self.env.uid] + [value for row in values for value in row],
+        )
+        self.browse(last_messages).invalidate_recordset(fnames)
+
+    @api.model
+    def _update_conversations_postcommit(self, last_messages, conversation_ids):
+        """
+        Update last message date and author and fields computed
+         from messages of Conversations after the current transaction
+         is committed, so the transaction does not lock Conversation rows.
+        Updates are accumulated and applied with a separate cursor.
+        :param dict last_messages: {conversation_id: (date, author_id)}
+        :param list conversation_ids: ids of Conversations
+         to recompute fields computed from messages for
+        :return: None
+        """
+        postcommit = self.env.cr.postcommit
+        pending = postcommit.data.get("cetmix.conversation.update")
+        if pending is None:
+            pending = postcommit.data["cetmix.conversation.update"] = {
+                "last_messages": {},
+                "conversation_ids": set(),
+            }
+            registry = self.env.registry
+
+            @postcommit.add
+            def update_conversations():
+                with registry.cursor() as cr:
+                    env = api.Environment(cr, SUPERUSER_ID, {})
+                    env["cetmix.conversation"]._update_conversations(
+                        pending["last_messages"], pending["conversation_ids"]
+                    )
+
+        pending_last_messages = pending["last_messages"]
+        for conversation_id, (date, author_id) in last_messages.items():
+            if (
+                conversation_id not in pending_last_messages
+                or pending_last_messages[conversation_id][0] <= date
+            ):
+                pending_last_messages[conversation_id] = (date, author_id)
+        pending["conversation_ids"].update(conversation_ids)
+
+    @api.model
+    def _update_conversations(self, last_messages, conversation_ids):
+        """
+        Update last message date and author and
+         recompute fields computed from messages of Conversations
+        :param dict last_messages: {conversation_id: (date, author_id)}
+        :param conversation_ids: ids of Conversations
+        :return: None
+        """
+        self._update_last_message(last_messages)
+        # Conversations may be deleted before the update
+        conversations = (
+            self.with_context(active_test=False).browse(list(conversation_ids)).exists()
+        )
+        conversations._recompute_message_fields()
+        conversations.flush_recordset(list(MESSAGE_COMPUTED_FIELDS))
+
+    @api.depends(
+        "partner_ids.name",
+        "last_message_author_id.name",
+    )
+    def _compute_subject_display_cache(self):
+        """
+        Compose user independent parts of the Tree View.
+        Only partner ids and names are stored,
+         avatars are rendered on read (see '_compute_subject_display').
+        Recomputed when participants change
+         and when messages are changed (see '_recompute_message_fields')
+        """
+        for rec in self:
+            last_message = False
+            if rec.last_message_id:
+                author = rec.last_message_author_id
+                last_message = {
+                    "author_id": author.id,
+                    "author_name": sanitize_name(author.name),
+                    "body": rec.last_message_preview or "",
                 }
+            rec.subject_display_cache = {
+                "participants": [
+                    [participant.id, sanitize_name(participant.name)]
+                    for participant in rec.partner_ids
+                ],
+                "last_message": last_message,
+            }
+
+    def _get_subject_display_avatars(self):
+        """
+        Render avatars of Conversation authors, participants
+         and last message authors for all Conversations at once
+        :return: tuple of dicts {partner_id: src}
+         (authors and participants, last message authors)
+        """
+        partner_ids = set(self.author_id.ids)
+        last_author_ids = set()
+        for rec in self:
+            display_cache = rec.subject_display_cache or {}
+            partner_ids.update(
+                participant[0] for participant in display_cache.get("participants", [])
             )
+            last_message = display_cache.get("last_message")
+            if last_message and last_message["author_id"]:
+                last_author_ids.add(last_message["author_id"])
+        # Stored ids may refer to partners deleted since
+        partners = (
+            self.env["res.partner"].browse(list(partner_ids | last_author_ids)).exists()
+        )
+        avatars = _get_avatar_srcs(
+            partners.filtered(lambda partner: partner.id in partner_ids)
+        )
+        last_author_avatars = _get_avatar_srcs(
+            partners.filtered(lambda partner: partner.id in last_author_ids),
+            "avatar_128",
+        )
+        return avatars, last_author_avatars
 
-    @api.depends("name")
+    @api.depends("name", "subject_display_cache", "message_count")
     def _compute_subject_display(self):
         """Get HTML view for Tree View"""
+        avatars, last_author_avatars = self._get_subject_display_avatars()
         # Compose subject
-        for rec in self.with_context(bin_size=False):
+        for rec in self:
             # Get message date with timezone
             date_display = ""
             message_date = ""
@@ -129,30 +410,33 @@ class Conversation(models.Model):
                         "need_action_count": message_needaction_count,
                     }
 
+            display_cache = rec.subject_display_cache or {}
             # Participants
             participant_text = " ".join(
                 [
                     PARTICIPANT_IMG
                     % {
-                        "title": sanitize_name(participant.name),
-                        "img": _get_decode_image(participant.image_128),
+                        "title": participant_name,
+                        "img": avatars.get(participant_id, avatars[False]),
                     }
-                    for participant in rec.partner_ids
+                    for participant_id, participant_name in display_cache.get(
+                        "participants", []
+                    )
                 ]
             )
             # Compose preview body
             plain_body = ""
-            for message in rec.message_ids:
-                if message.message_type != "notification":
-                    plain_body = PLAIN_BODY % {
-                        "title": sanitize_name(message.author_id.name),
-                        "img": _get_decode_image(message.author_avatar),
-                        "body": message.preview,
-                    }
-                    break
-
+            last_message = display_cache.get("last_message")
+            if last_message:
+                plain_body = PLAIN_BODY % {
+                    "title": last_message["author_name"],
+                    "img": last_author_avatars.get(
+                        last_message["author_id"], last_author_avatars[False]
+                    ),
+                    "body": last_message["body"],
+                }
             rec.subject_display = TREE_TEMPLATE % {
-                "avatar": _get_decode_image(rec.author_id.image_128),
+                "avatar": avatars[rec.author_id.id],
                 "title": sanitize_name(rec.author_id.name),
                 "author": rec.author_id.name or "",
                 "subject": rec.name or "",
@@ -201,41 +485,76 @@ class Conversation(models.Model):
         result = super().write(vals)
         only_conversation = self._context.get("only_conversation", False)
         if "active" in vals.keys() and not only_conversation:
-            for rec in self:
-                rec.archive_conversion_message(vals.get("active"))
+            self.archive_conversion_message(vals.get("active"))
 
         if self._context.get("skip_followers_test", False):
             # Skip checking for followers/participants
             return result
 
         # Check if participants changed
+        self._sync_participant_followers()
+        return result
+
+    def _sync_participant_followers(self):
+        """
+        Make participants the only followers of Conversations.
+        Followers of all Conversations are fetched at once.
+        Conversations requiring the same changes are processed together.
+        :return: None
+        """
+        follower_ids = {
+            res_id: set(partner_ids)
+            for res_id, partner_ids in self.env["mail.followers"]
+            .sudo()
+            ._read_group(
+                [
+                    ("res_model", "=", self._name),
+                    ("res_id", "in", self.ids),
+                    ("partner_id", "!=", False),
+                ],
+                groupby=["res_id"],
+                aggregates=["partner_id:array_agg"],
+            )
+        }
+        followers_add = defaultdict(list)
+        followers_remove = defaultdict(list)
         for rec in self:
-            msg_partner_ids = rec.message_partner_ids.ids
-            partner_ids = rec.partner_ids.ids
+            msg_partner_ids = follower_ids.get(rec.id, set())
+            partner_ids = set(rec.partner_ids.ids)
+            # Participants not changed
+            if partner_ids == msg_partner_ids:
+                continue
             # New followers added?
-            followers_add = list(
-                filter(lambda p: p not in msg_partner_ids, partner_ids)
-            )
-            if followers_add:
-                rec.message_subscribe(partner_ids=followers_add)
-
+            partner_ids_add = partner_ids - msg_partner_ids
+            if partner_ids_add:
+                followers_add[frozenset(partner_ids_add)].append(rec.id)
             # Existing followers removed?
-            followers_remove = list(
-                filter(lambda p: p not in partner_ids, msg_partner_ids)
-            )
-            if followers_remove:
-                rec.message_unsubscribe(partner_ids=followers_remove)
+            partner_ids_remove = msg_partner_ids - partner_ids
+            if partner_ids_remove:
+                followers_remove[frozenset(partner_ids_remove)].append(rec.id)
 
-        return result
+        for partner_ids, conversation_ids in followers_add.items():
+            self.browse(conversation_ids).message_subscribe(
+                partner_ids=list(partner_ids)
+            )
+        for partner_ids, conversation_ids in followers_remove.items():
+            self.browse(conversation_ids).message_unsubscribe(
+                partner_ids=list(partner_ids)
+            )
 
     def archive_conversion_message(self, active_state):
-        """Set archive state for related mail messages"""
+        """
+        Set archive state for related mail messages.
+        Messages of all Conversations are updated with a single write.
+        """
+        if not self:
+            return
         messages = self.env["mail.message"].search(
             [
                 ("active", "=", not active_state),
                 ("model", "=", self._name),
-                ("res_id", "=", self.id),
-                ("message_type", "!=", "notification"),
+                ("res_id", "in", self.ids),
+                ("message_type", "not in", CONVERSATION_EXCLUDED_MESSAGE_TYPES),
             ]
         )
         msg_vals = {"active": active_state}
@@ -247,21 +566,118 @@ class Conversation(models.Model):
     @api.model
     def partner_by_email(self, email_addresses):
         """
-        Override this method to implement custom search
-         (e.g. if using prt_phone_numbers module)
+        Get partner by email addresses
         :param list email_addresses: List of email addresses
         :return: res.partner obj if found.
         Please pay attention to the fact that only
          the first (newest) partner found is returned!
         """
-        # Use loop with '=ilike' to resolve MyEmail@GMail.com cases
-        res_partner_obj = self.env["res.partner"]
+        partner_ids = self._partner_ids_by_emails(email_addresses)
         for address in email_addresses:
-            partner = res_partner_obj.search(
-                [("email", "=ilike", address)], limit=1, order="id desc"
-            )
-            if partner:
-                return partner
+            partner_id = address and partner_ids.get(address.lower())
+            if partner_id:
+                return self.env["res.partner"].browse(partner_id)
+
+    @api.model
+    def _partner_ids_by_emails(self, email_addresses):
+        """
+        Override this method to implement custom search
+         (e.g. if using prt_phone_numbers module)
+        All addresses are resolved at once. Emails are compared
+         case insensitive to resolve MyEmail@GMail.com cases.
+        :param list email_addresses: List of email addresses
+        :return: dict {lowercase email: id of the newest partner found}
+        """
+        emails = list({address.lower() for address in email_addresses if address})
+        if not emails:
+            return {}
+        res_partner_obj = self.env["res.partner"]
+        # Use 'lower(email)' index
+        res_partner_obj.flush_model(["email"])
+        self._cr.execute(
+            """ SELECT lower(email), id FROM res_partner
+                WHERE lower(email) = ANY(%s)
+                ORDER BY id DESC """,
+            (emails,),
+        )
+        rows = self._cr.fetchall()
+        allowed_ids = set(
+            res_partner_obj.search([("id", "in", [row[1] for row in rows])]).ids
+        )
+        partner_ids = {}
+        for email, partner_id in rows:
+            if partner_id in allowed_ids and email not in partner_ids:
+                partner_ids[email] = partner_id
+        return partner_ids
+
+    @api.model
+    def _get_or_create_partner_ids_by_emails(self, emails):
+        """
+        Get or create partner ids.
+        Existing partners are searched at once and
+         missing partners are created with a single 'create'.
+        :param list emails: list of email addresses
+        :rtype: list
+        :return: list of partner ids in the order of email addresses
+        """
+        res_partner_obj = self.env["res.partner"]
+        parsed_emails = [
+            res_partner_obj._parse_partner_name(email) if email else (False, False)
+            for email in emails
+        ]
+        partner_ids = self._partner_ids_by_emails(
+            [parsed_email for __, parsed_email in parsed_emails]
+        )
+        # Give 'partner_by_email' overrides a chance to find the rest.
+        # It resolves a single partner per call, so it is only called
+        #  if overridden to keep the number of queries constant
+        if type(self).partner_by_email is not Conversation.partner_by_email:
+            for __, parsed_email in parsed_emails:
+                key = parsed_email and parsed_email.lower()
+                if key and key not in partner_ids:
+                    partner = self.partner_by_email([parsed_email])
+                    if partner:
+                        partner_ids[key] = partner.id
+        category = self.env.ref(
+            "prt_mail_messages.cetmix_conversations_partner_cat",
+            raise_if_not_found=False,
+        )
+        # {email index: index in vals_list}
+        create_positions = {}
+        # {lowercase email: index in vals_list}
+        email_positions = {}
+        vals_list = []
+        for index, (email, (parsed_name, parsed_email)) in enumerate(
+            zip(emails, parsed_emails)
+        ):
+            key = parsed_email and parsed_email.lower()
+            if not email or key in partner_ids:
+                continue
+            # Create a single partner for the same email address
+            if key in email_positions:
+                create_positions[index] = email_positions[key]
+                continue
+            create_positions[index] = len(vals_list)
+            if key:
+                email_positions[key] = len(vals_list)
+            create_values = {
+                "name": parsed_name or parsed_email,
+                "category_id": [(4, category.id)] if category else False,
+            }
+            if parsed_email:
+                create_values["email"] = parsed_email
+            vals_list.append(create_values)
+        new_partner_ids = res_partner_obj.create(vals_list).ids if vals_list else []
+
+        result = []
+        for index, (email, (__, parsed_email)) in enumerate(zip(emails, parsed_emails)):
+            if not email:
+                result.append(False)
+            elif index in create_positions:
+                result.append(new_partner_ids[create_positions[index]])
+            else:
+                result.append(partner_ids[parsed_email.lower()])
+        return result
 
     @api.model
     def get_or_create_partner_id_by_email(self, email):
@@ -273,22 +689,7 @@ class Conversation(models.Model):
         """
         if not email:
             return False
-        res_partner_obj = self.env["res.partner"]
-        parsed_name, parsed_email = res_partner_obj._parse_partner_name(email)
-        partner = self.partner_by_email([parsed_email])
-        if partner:
-            return partner.id
-        category = self.env.ref(
-            "prt_mail_messages.cetmix_conversations_partner_cat",
-            raise_if_not_found=False,
-        )
-        create_values = {
-            "name": parsed_name or parsed_email,
-            "category_id": [(4, category.id)] if category else False,
-        }
-        if parsed_email:
-            create_values["email"] = parsed_email
-        return res_partner_obj.create(create_values).id
+        return self._get_or_create_partner_ids_by_emails([email])[0]
 
     @api.model
     def prepare_partner_ids(self, email_list):
@@ -300,15 +701,20 @@ class Conversation(models.Model):
         """
         if not email_list:
             return set()
-        return {
-            self.get_or_create_partner_id_by_email(email)
-            for email in tools.email_split_and_format(email_list)
-        }
+        return set(
+            self._get_or_create_partner_ids_by_emails(
+                tools.email_split_and_format(email_list)
+            )
+        )
 
     @api.model
     def message_new(self, msg_dict, custom_values=None):
         """Parse incoming email"""
         custom_values = custom_values or {}
+        if self.env["ir.config_parameter"]._get_cetmix_settings()[
+            "cetmix.conversation_deferred_processing"
+        ]:
+            return self._message_new_deferred(msg_dict, custom_values)
         partner_ids = set()
 
         # 1. Check for author. If does not exist create new partner.
@@ -322,10 +728,10 @@ class Conversation(models.Model):
         # Append author to participants (partners)
         partner_ids.add(author_id)
 
-        # To
-        partner_ids |= self.prepare_partner_ids(msg_dict.get("to"))
-        # Cc
-        partner_ids |= self.prepare_partner_ids(msg_dict.get("cc"))
+        # To and Cc
+        partner_ids |= self.prepare_partner_ids(
+            ", ".join(filter(None, (msg_dict.get("to"), msg_dict.get("cc"))))
+        )
 
         # Update custom values
         custom_values.update(
@@ -338,3 +744,36 @@ class Conversation(models.Model):
         return super(
             Conversation, self.with_context(mail_create_nolog=True)
         ).message_new(msg_dict, custom_values)
+
+    @api.model
+    def _message_new_deferred(self, msg_dict, custom_values):
+        """
+        Create Conversation from incoming email with minimal work.
+        Missing partners are created and subscribed
+         later by cron (see 'cetmix.conversation.queue')
+        :param dict msg_dict: parsed email
+        :param dict custom_values: values of new Conversation
+        :return: cetmix.conversation record
+        """
+        # Existing partners are added at once, so they are notified
+        #  about the incoming message the same way as without deferring.
+        # Missing partners are created by cron and are not notified.
+        email_list = ", ".join(filter(None, (msg_dict.get("to"), msg_dict.get("cc"))))
+        partner_ids = set(
+            self._partner_ids_by_emails(tools.email_split(email_list)).values()
+        )
+        author_id = msg_dict.get("author_id")
+        if author_id:
+            partner_ids.add(author_id)
+            custom_values["author_id"] = author_id
+        custom_values.update(
+            {
+                "name": msg_dict.get("subject", "").strip(),
+                "partner_ids": [(4, pid) for pid in partner_ids],
+            }
+        )
+        conversation = super(
+            Conversation, self.with_context(mail_create_nolog=True)
+        ).message_new(msg_dict, custom_values)
+        self.env["cetmix.conversation.queue"]._enqueue(conversation, msg_dict)
+        return conversation
@@ -0,0 +1,286 @@
+###################################################################################
+#
+#    Copyright (C) 2020 Cetmix OÜ
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU LESSER GENERAL PUBLIC LICENSE as
+#    published by the Free Software Foundation, either version 3 of the
+#    License, or (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU LESSER GENERAL PUBLIC LICENSE for more details.
+#
+#    You should have received a copy of the GNU LESSER GENERAL PUBLIC LICENSE
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+###################################################################################
+
+
+import logging
+import threading
+import time
+from collections import defaultdict
+
+from odoo import api, fields, models, tools
+
+from .common import CONVERSATION_QUEUE_BATCH_SIZE, CONVERSATION_QUEUE_MAX_ATTEMPTS
+from .tools import _get_cron_time_limit
+
+_logger = logging.getLogger(__name__)
+
+# Share of the cron time limit the queue cron may use
+QUEUE_TIME_LIMIT_RATIO = 0.8
+
+
+class ConversationQueue(models.Model):
+    """
+    Inbound Conversation emails waiting for post-processing.
+    When deferred processing is enabled the mail gateway only creates
+     the Conversation and its message. Partners are resolved and
+     participants are subscribed later by cron in batches.
+    """
+
+    _name = "cetmix.conversation.queue"
+    _description = "Conversation Email Queue"
+    _order = "id"
+
+    conversation_id = fields.Many2one(
+        comodel_name="cetmix.conversation",
+        required=True,
+        ondelete="cascade",
+        index=True,
+    )
+    message_id = fields.Char(string="Message-Id")
+    author_id = fields.Many2one(comodel_name="res.partner", ondelete="set null")
+    email_from = fields.Char(string="From")
+    email_to = fields.Char(string="To", help="To and Cc addresses")
+    state = fields.Selection(
+        selection=[("pending", "Pending"), ("failed", "Failed")],
+        default="pending",
+        required=True,
+        index=True,
+    )
+    attempt_count = fields.Integer(string="Attempts")
+    error = fields.Text()
+
+    def action_retry(self):
+        """Process failed emails again"""
+        self.write({"state": "pending", "attempt_count": 0, "error": False})
+        self._trigger_processing()
+
+    @api.model
+    def _enqueue(self, conversation, msg_dict):
+        """
+        Queue inbound email for post-processing
+        :param conversation: cetmix.conversation record
+        :param dict msg_dict: parsed email
+        :return: cetmix.conversation.queue record
+        """
+        job = self.sudo().create(
+            {
+                "conversation_id": conversation.id,
+                "message_id": msg_dict.get("message_id"),
+                "author_id": msg_dict.get("author_id"),
+                "email_from": msg_dict.get("email_from"),
+                "email_to": ", ".join(
+                    filter(None, (msg_dict.get("to"), msg_dict.get("cc")))
+                ),
+            }
+        )
+        self._trigger_processing()
+        return job
+
+    @api.model
+    def _trigger_processing(self):
+        """
+        Trigger queue cron once per transaction, right before commit,
+         so bursts of incoming emails are processed in a single run
+        :return: None
+        """
+        precommit = self.env.cr.precommit
+        if precommit.data.get("cetmix.conversation.queue.trigger"):
+            return
+        precommit.data["cetmix.conversation.queue.trigger"] = True
+        cron = self.env.ref(
+            "prt_mail_messages.ir_cron_cetmix_conversation_queue"
+        ).sudo()
+        precommit.add(cron._trigger)
+
+    @api.model
+    def _cron_process_queue(self):
+        """
+        Process queued emails by cron.
+        Emails are locked with 'SKIP LOCKED', so several copies
+         of the cron can run in parallel. Changes are committed
+         after each batch. If cron time limit is about to be reached
+         the cron is triggered again to continue with remaining emails.
+        :return: True always
+        """
+        settings = self.env["ir.config_parameter"]._get_cetmix_settings()
+        batch_size = (
+            settings["cetmix.conversation_deferred_batch_size"]
+            or CONVERSATION_QUEUE_BATCH_SIZE
+        )
+        max_attempts = (
+            settings["cetmix.conversation_deferred_max_attempts"]
+            or CONVERSATION_QUEUE_MAX_ATTEMPTS
+        )
+        auto_commit = not getattr(threading.current_thread(), "testing", False)
+        time_limit = _get_cron_time_limit(QUEUE_TIME_LIMIT_RATIO)
+        start_time = time.time()
+        last_id = 0
+        count = 0
+        while True:
+            jobs = self._lock_pending(batch_size, last_id)
+            if not jobs:
+                break
+            last_id = jobs.ids[-1]
+            count += len(jobs)
+            jobs._process_batch(max_attempts)
+            if auto_commit:
+                self.env.cr.commit()  # pylint: disable=invalid-commit
+            if len(jobs) < batch_size:
+                break
+            # Continue in the next cron run
+            if time_limit and time.time() - start_time > time_limit:
+                self.env.ref(
+                    "prt_mail_messages.ir_cron_cetmix_conversation_queue"
+                )._trigger()
+                _logger.info("Conversation queue: time limit reached, rescheduled")
+                break
+        if count:
+            _logger.info(
+                "Conversation queue: %s emails processed in %.2fs",
+                count,
+                time.time() - start_time,
+            )
+        return True
+
+    @api.model
+    def _lock_pending(self, limit, last_id=0):
+        """
+        Lock pending emails not locked by other transactions
+        :param int limit: max number of emails
+        :param int last_id: only emails with greater id are locked
+        :return: cetmix.conversation.queue recordset
+        """
+        self.flush_model(["state"])
+        self._cr.execute(
+            f"""SELECT id FROM {self._table}
+                WHERE state = 'pending' AND id > %s
+                ORDER BY id
+                LIMIT %s
+                FOR UPDATE SKIP LOCKED""",
+            (last_id, limit),
+        )
+        return self.browse([row[0] for row in self._cr.fetchall()])
+
+    def _process_batch(self, max_attempts):
+        """
+        Process emails and remove them from queue.
+        If batch fails emails are processed one by one,
+         so a single broken email does not block the others.
+        :param int max_attempts: attempts before email is marked as failed
+        :return: None
+        """
+        try:
+            with self.env.cr.savepoint():
+                self._process()
+            self.unlink()
+            return
+        except Exception:
+            _logger.warning(
+                "Conversation queue: batch failed, processing emails one by one",
+                exc_info=True,
+            )
+            self.env.invalidate_all()
+        for job in self:
+            try:
+                with self.env.cr.savepoint():
+                    job._process()
+                job.unlink()
+            except Exception as error:
+                _logger.exception(
+                    "Conversation queue: failed to process email %s", job.message_id
+                )
+                self.env.invalidate_all()
+                attempt_count = job.attempt_count + 1
+                job.write(
+                    {
+                        "attempt_count": attempt_count,
+                        "error": str(error),
+                        "state": "failed"
+                        if attempt_count >= max_attempts
+                        else "pending",
+                    }
+                )
+
+    def _process(self):
+        """
+        Resolve partners, set authors and add participants.
+        Addresses of all emails are resolved at once and Conversations
+         with the same changes are updated together.
+        :return: None
+        """
+        Conversation = self.env["cetmix.conversation"].sudo()
+        # Collect addresses of all emails: author first
+        emails = []
+        positions = []
+        for job in self:
+            job_emails = tools.email_split_and_format(job.email_to or "")
+            emails.append(False if job.author_id else job.email_from)
+            positions.append((len(emails) - 1, len(emails), len(job_emails)))
+            emails += job_emails
+        partner_ids = Conversation._get_or_create_partner_ids_by_emails(emails)
+
+        conversations_by_author = defaultdict(list)
+        messages_by_author = defaultdict(list)
+        conversations_by_partners = defaultdict(list)
+        for job, (author_position, start, length) in zip(self, positions):
+            author_id = job.author_id.id or partner_ids[author_position]
+            if author_id:
+                conversations_by_author[author_id].append(job.conversation_id.id)
+                if job.message_id:
+                    messages_by_author[author_id].append(
+                        (job.conversation_id.id, job.message_id)
+                    )
+            participant_ids = set(partner_ids[start : start + length])
+            participant_ids.add(author_id)
+            participant_ids.discard(False)
+            if participant_ids:
+                conversations_by_partners[frozenset(participant_ids)].append(
+                    job.conversation_id.id
+                )
+
+        for author_id, conversation_ids in conversations_by_author.items():
+            Conversation.browse(conversation_ids).with_context(
+                skip_followers_test=True
+            ).write({"author_id": author_id})
+        self._set_message_authors(messages_by_author)
+        # Participants are subscribed as followers on write
+        for participant_ids, conversation_ids in conversations_by_partners.items():
+            Conversation.browse(conversation_ids).write(
+                {"partner_ids": [(4, pid) for pid in participant_ids]}
+            )
+
+    @api.model
+    def _set_message_authors(self, messages_by_author):
+        """
+        Set author of inbound messages posted without author
+        :param dict messages_by_author:
+            {author_id: [(conversation_id, Message-Id)]}
+        :return: None
+        """
+        MailMessage = self.env["mail.message"].sudo()
+        for author_id, keys in messages_by_author.items():
+            messages = MailMessage.search(
+                [
+                    ("model", "=", "cetmix.conversation"),
+                    ("res_id", "in", [conversation_id for conversation_id, __ in keys]),
+                    ("message_id", "in", [message_id for __, message_id in keys]),
+                    ("author_id", "=", False),
+                ]
+            )
+            messages.write({"author_id": author_id})
@@ -18,6 +18,7 @@
 ###################################################################################
 
 from odoo import api, fields, models
+from odoo.tools import ormcache
 
 
 class CxModelReference(models.Model):
@@ -53,11 +54,44 @@ class CxModelReference(models.Model):
         if self.ir_model_id:
             self.custom_name = self.ir_model_id.name
 
+    @api.model_create_multi
+    def create(self, vals_list):
+        res = super().create(vals_list)
+        self.env.registry.clear_cache()
+        return res
+
+    def write(self, vals):
+        res = super().write(vals)
+        self.env.registry.clear_cache()
+        return res
+
+    def unlink(self):
+        res = super().unlink()
+        self.env.registry.clear_cache()
+        return res
+
     @api.model
     def referenceable_models(self):
-        IrModelAccess = self.env["ir.model.access"].with_user(self.env.user.id)
-        return [
+        """
+        List models user can read
+        :return: list of tuples (model, custom name)
+        """
+        return list(self._get_referenceable_models(self.env.uid, self.env.lang))
+
+    @api.model
+    @ormcache("uid", "lang")
+    def _get_referenceable_models(self, uid, lang):
+        """
+        Result is stored in the registry cache which is cleared
+         when models are installed or removed, user access rights
+         or referable models are changed.
+        :param int uid: user id
+        :param str lang: user language
+        :return: tuple of tuples (model, custom name)
+        """
+        IrModelAccess = self.env["ir.model.access"].with_user(uid)
+        return tuple(
             (x.model, x.custom_name)
-            for x in self.search([])
+            for x in self.with_user(uid).with_context(lang=lang).search([])
             if IrModelAccess.check(x.model, "read", False)
-        ]
+        )
@@ -18,6 +18,9 @@
 ###################################################################################
 
 from odoo import api, models
+from odoo.tools import frozendict, ormcache
+
+from .common import CETMIX_SETTINGS
 
 
 class IrConfigParameter(models.Model):
@@ -29,3 +32,39 @@ class IrConfigParameter(models.Model):
         if self._context.get("allow_catchall") and key == "mail.catchall.alias":
             return False
         return super().get_param(key, default)
+
+    @api.model
+    def _get_cetmix_settings(self):
+        """
+        Get snapshot of all 'cetmix.*' settings.
+        Values are converted to their types, missing ones are set to defaults.
+        Snapshot is stored in the registry cache which is cleared
+         each time a parameter is set.
+        :return: frozendict {key: value}
+        """
+        return self._get_cetmix_settings_cached()
+
+    @api.model
+    @ormcache()
+    def _get_cetmix_settings_cached(self):
+        self.flush_model(["key", "value"])
+        self._cr.execute(
+            "SELECT key, value FROM ir_config_parameter WHERE key = ANY(%s)",
+            (list(CETMIX_SETTINGS),),
+        )
+        values = dict(self._cr.fetchall())
+        settings = {}
+        for key, (value_type, default) in CETMIX_SETTINGS.items():
+            value = values.get(key)
+            if value is None:
+                settings[key] = default
+            elif value_type is bool:
+                settings[key] = value not in ("", "0", "False")
+            elif value_type is int:
+                try:
+                    settings[key] = int(value)
+                except ValueError:
+                    settings[key] = default
+            else:
+                settings[key] = value
+        return frozendict(settings)
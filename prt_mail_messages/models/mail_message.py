@@ -19,24 +19,76 @@
 
 import logging
 import re
+import threading
+import time
+from collections import defaultdict
 from datetime import timedelta
 from email.utils import parseaddr
 
-from odoo import _, api, fields, models
+from odoo import Command, _, api, fields, models
 from odoo.exceptions import AccessError
 from odoo.osv import expression
-from odoo.tools import html_escape, html_to_inner_content
-
-from .common import DEFAULT_MESSAGE_PREVIEW_LENGTH, IMAGE_PLACEHOLDER, TREE_TEMPLATE
-from .tools import _prepare_date_display, _prepare_notification
+from odoo.tools import (
+    html_escape,
+    html_to_inner_content,
+    ormcache,
+    split_every,
+)
+
+from .common import (
+    CONVERSATION_EXCLUDED_MESSAGE_TYPES,
+    DEFAULT_MESSAGE_PREVIEW_LENGTH,
+    DEFAULT_SEARCH_LANGUAGE,
+    FORBIDDEN_MODELS,
+    MESSAGE_BATCH_SIZE,
+    TRASH_PURGE_BATCH_SIZE,
+    TRASH_PURGE_TIME_LIMIT_RATIO,
+    TREE_TEMPLATE,
+)
+from .tools import (
+    _create_indexes_concurrently,
+    _get_avatar_srcs,
+    _get_cron_time_limit,
+    _prepare_date_display,
+    _prepare_notification,
+)
 
 _logger = logging.getLogger(__name__)
 
-# List of forbidden models
-FORBIDDEN_MODELS = ["mail.channel", "mail.message"]
-
-# Search for 'ghost' models is performed
-GHOSTS_CHECKED = False
+# Max number of fetches performed to fill a page of the Messages Easy List View
+MESSAGES_SEARCH_MAX_FETCH = 10
+
+# Full-text search document composed of subject, plain body text and sender
+SEARCH_TEXT_DOCUMENT = (
+    "to_tsvector('%s'::regconfig, "
+    "coalesce(subject, '') || ' ' || "
+    "coalesce(regexp_replace(body, '<[^>]*>', ' ', 'g'), '') || ' ' || "
+    "coalesce(email_from, ''))"
+)
+# Index name depends on text search configuration: {language}
+SEARCH_TEXT_INDEX = "mail_message_search_text_%s_index"
+
+# Indexes used by Messages Easy queries: {name: definition}
+MESSAGE_INDEXES = {
+    # Trash: only messages moved to trash have 'Deleted by' set
+    "mail_message_trash_index": "btree (delete_date) WHERE delete_uid IS NOT NULL",
+    # Date range filters on large tables
+    "mail_message_date_brin_index": "brin (date)",
+}
+
+# Indexes created by previous versions and not used anymore.
+# Thread lookups are served by the core (model, res_id) index
+OBSOLETE_MESSAGE_INDEXES = ["mail_message_model_res_id_message_type_index"]
+
+# Message fields affecting fields computed from Conversation messages
+CONVERSATION_TRACKED_FIELDS = {
+    "active",
+    "model",
+    "res_id",
+    "message_type",
+    "author_id",
+    "body",
+}
 
 
 ################
@@ -76,6 +128,19 @@ class MailMessage(models.Model):
         help="Used for Shared Inbox filter only",
         search="_search_shared_inbox",
     )
+    search_text = fields.Char(
+        string="Text",
+        compute="_compute_dummy",
+        help="Used for full-text search in subject, body and sender only",
+        search="_search_search_text",
+    )
+    cx_inbox_ids = fields.One2many(
+        string="Inbox",
+        comodel_name="cetmix.message.inbox",
+        inverse_name="message_id",
+        auto_join=True,
+        help="Used for Unread and Starred filters only",
+    )
     cx_edit_uid = fields.Many2one(string="Edited by", comodel_name="res.users")
     cx_edit_date = fields.Datetime(string="Edited on")
     cx_edit_message = fields.Char(
@@ -133,11 +198,12 @@ class MailMessage(models.Model):
     def _compute_cx_edit_message(self):
         # Get current timezone
         # Check messages
+        now = fields.Datetime.now()
         for rec in self:
             if not rec.cx_edit_uid:
                 rec.cx_edit_message = False
                 continue
-            date_display = _prepare_date_display(rec, rec.cx_edit_date)
+            date_display = _prepare_date_display(rec, rec.cx_edit_date, now)
             rec.cx_edit_message = _("Edited by %(name)s %(date)s") % {
                 "name": rec.cx_edit_uid.name,
                 "date": date_display[1],
@@ -153,6 +219,134 @@ class MailMessage(models.Model):
             ]
         return [("author_id", "!=", False)]
 
+    def _get_inbox_domain(self, inbox_domain):
+        """
+        Get domain for messages in current user inbox
+        :param list inbox_domain: domain for cetmix.message.inbox
+        :return: domain for cetmix.message.inbox
+        """
+        domain = [("partner_id", "=", self.env.user.partner_id.id)] + inbox_domain
+        # Trashed messages are not active anyway
+        if self._context.get("active_test", True):
+            domain.append(("is_trashed", "=", False))
+        return domain
+
+    def _search_needaction(self, operator, operand):
+        """
+        Search unread messages in inbox table.
+        Only Messages Easy views use the table, Discuss keeps core search
+        """
+        if self._context.get("check_messages_access") and operator == "=" and operand:
+            return [
+                (
+                    "cx_inbox_ids",
+                    "any",
+                    self._get_inbox_domain([("is_read", "=", False)]),
+                )
+            ]
+        return super()._search_needaction(operator, operand)
+
+    def _search_starred(self, operator, operand):
+        """
+        Search starred messages in inbox table.
+        Only Messages Easy views use the table, Discuss keeps core search
+        """
+        if not self._context.get("check_messages_access"):
+            return super()._search_starred(operator, operand)
+        inbox_domain = self._get_inbox_domain([("is_starred", "=", True)])
+        if operator == "=" and operand:
+            return [("cx_inbox_ids", "any", inbox_domain)]
+        return [("cx_inbox_ids", "not any", inbox_domain)]
+
+    def _search_search_text(self, operator, value):
+        """
+        Full-text search in message subject, body and sender.
+        Uses the index maintained by PostgreSQL on insert and update.
+        Matches are not ranked: messages keep the list order,
+         which keyset pagination relies on.
+        """
+        if operator in expression.NEGATIVE_TERM_OPERATORS:
+            return [
+                "!",
+                ("search_text", expression.TERM_OPERATORS_NEGATION[operator], value),
+            ]
+        if not value or not isinstance(value, str):
+            return [(1, "=", 1)]
+        language = self._get_search_language()
+        query = self.sudo().with_context(active_test=False)._where_calc([])
+        query.add_where(
+            f"{SEARCH_TEXT_DOCUMENT % language} @@ plainto_tsquery(%s::regconfig, %s)",
+            [language, value],
+        )
+        return [("id", "in", query)]
+
+    @api.model
+    def _get_search_language(self):
+        """
+        Get text search configuration used for full-text search
+        :return: name of PostgreSQL text search configuration
+        """
+        language = self.env["ir.config_parameter"]._get_cetmix_settings()[
+            "cetmix.messages_easy_search_language"
+        ]
+        if language not in self._get_search_languages():
+            return DEFAULT_SEARCH_LANGUAGE
+        return language
+
+    @api.model
+    @ormcache()
+    def _get_search_languages(self):
+        """
+        Get text search configurations available in database
+        :return: tuple of configuration names
+        """
+        self._cr.execute("SELECT cfgname FROM pg_ts_config ORDER BY cfgname")
+        return tuple(row[0] for row in self._cr.fetchall())
+
+    def _auto_init(self):
+        res = super()._auto_init()
+        self._update_indexes()
+        return res
+
+    @api.model
+    def _get_search_text_index(self):
+        """
+        Get full-text search index for current text search configuration
+        :return: tuple (index name, index definition)
+        """
+        language = self._get_search_language()
+        return (
+            SEARCH_TEXT_INDEX % re.sub(r"\W", "_", language),
+            f"gin ({SEARCH_TEXT_DOCUMENT % language})",
+        )
+
+    @api.model
+    def _update_indexes(self):
+        """
+        Create missing message indexes once the current transaction
+         is committed (e.g. module installation or settings update).
+        Indexes are built without locking the table.
+        Full-text search indexes of other text search configurations
+         and obsolete indexes are dropped when new ones are ready.
+        """
+        search_text_index, search_text_definition = self._get_search_text_index()
+        indexes = dict(MESSAGE_INDEXES, **{search_text_index: search_text_definition})
+        prefix = SEARCH_TEXT_INDEX.split("%s")[0].replace("_", "\\_")
+        self._cr.execute(
+            """ SELECT indexname FROM pg_indexes
+                WHERE tablename = %s
+                AND (indexname LIKE %s OR indexname = ANY(%s)) """,
+            (self._table, f"{prefix}%", OBSOLETE_MESSAGE_INDEXES),
+        )
+        obsolete = [
+            row[0] for row in self._cr.fetchall() if row[0] != search_text_index
+        ]
+        registry = self.env.registry
+        table = self._table
+        self.env.cr.postcommit.add(
+            lambda: _create_indexes_concurrently(registry, table, indexes, obsolete)
+        )
+
     # -- Get model name for Form View
     def _compute_model_name(self):
         IrModelSudo = self.env["ir.model"].sudo()
@@ -166,21 +360,52 @@ class MailMessage(models.Model):
 
     # -- Star several messages
     def mark_read_multi(self):
-        for rec in self:
-            if rec.needaction:
-                rec.set_message_done()
-            if rec.parent_id and rec.parent_id.needaction:
-                rec.parent_id.set_message_done()
+        """
+        Mark messages and their parent messages as read.
+        Notifications of all messages are updated at once.
+        """
+        (self | self.parent_id).set_message_done()
 
     # -- Star several messages
     def star_multi(self):
-        for rec in self:
-            rec.toggle_message_starred()
+        """
+        Toggle starred state of messages.
+        Messages are starred and unstarred in two groups
+         with a single notification per group.
+        """
+        if not self:
+            return
+        self.check_access_rule("read")
+        partner = self.env.user.partner_id
+        messages_to_star = self.filtered(lambda msg: not msg.starred)
+        for messages, starred in (
+            (messages_to_star, True),
+            (self - messages_to_star, False),
+        ):
+            if not messages:
+                continue
+            messages.sudo().write(
+                {
+                    "starred_partner_ids": [
+                        Command.link(partner.id)
+                        if starred
+                        else Command.unlink(partner.id)
+                    ]
+                }
+            )
+            self.env["bus.bus"]._sendone(
+                partner,
+                "mail.message/toggle_star",
+                {"message_ids": messages.ids, "starred": starred},
+            )
 
     # -- Archive/unarchive message
     def archive(self):
-        for rec in self.filtered(lambda msg: not msg.delete_date):
-            rec.active = not rec.active
+        """Toggle active state of messages not moved to trash"""
+        messages = self.filtered(lambda msg: not msg.delete_date)
+        messages_active = messages.filtered("active")
+        (messages - messages_active).write({"active": True})
+        messages_active.write({"active": False})
 
     def undelete(self):
         """Undelete message from trash"""
@@ -200,74 +425,148 @@ class MailMessage(models.Model):
     @api.model
     def _unlink_trash_message(self, test_custom_datetime=None):
         """
-        Delete old messages by cron
+        Delete old messages by cron.
+        Messages are deleted in batches and changes are committed
+         after each batch. If cron time limit is about to be reached
+         the cron is triggered again to continue with remaining messages.
         :param test_custom_datetime - argument for testing
         :return True always
         """
-        messages_easy_empty_trash = int(
-            self.env["ir.config_parameter"]
-            .sudo()
-            .get_param("cetmix.messages_easy_empty_trash", 0)
+        settings = self.env["ir.config_parameter"]._get_cetmix_settings()
+        messages_easy_empty_trash = settings["cetmix.messages_easy_empty_trash"]
+        if messages_easy_empty_trash <= 0:
+            return True
+        batch_size = (
+            settings["cetmix.messages_easy_empty_trash_batch_size"]
+            or TRASH_PURGE_BATCH_SIZE
         )
-        if messages_easy_empty_trash > 0:
-            compute_datetime = fields.Datetime.now() - timedelta(
-                days=messages_easy_empty_trash
-            )
-            result = self.sudo().search(
-                [
-                    ("active", "=", False),
-                    ("delete_uid", "!=", False),
-                    ("delete_date", "<=", test_custom_datetime or compute_datetime),
-                    ("message_type", "!=", "notification"),
-                ]
+        compute_datetime = fields.Datetime.now() - timedelta(
+            days=messages_easy_empty_trash
+        )
+        domain = [
+            ("active", "=", False),
+            ("delete_uid", "!=", False),
+            ("delete_date", "<=", test_custom_datetime or compute_datetime),
+            ("message_type", "!=", "notification"),
+        ]
+        auto_commit = not getattr(threading.current_thread(), "testing", False)
+        time_limit = self._get_trash_purge_time_limit()
+        start_time = time.time()
+        count = 0
+        last_id = 0
+        while True:
+            # Skip processed ids so messages left by 'unlink_pro'
+            # are not fetched again and cannot loop forever
+            messages = self.sudo().search(
+                domain + [("id", ">", last_id)], limit=batch_size, order="id"
             )
-            result.unlink_pro()
+            if not messages:
+                break
+            last_id = messages[-1].id
+            messages.unlink_pro()
+            # Only messages actually deleted are counted
+            count += len(messages) - len(messages.exists())
+            if auto_commit:
+                self.env.cr.commit()  # pylint: disable=invalid-commit
+            if len(messages) < batch_size:
+                break
+            # Continue in the next cron run
+            if time_limit and time.time() - start_time > time_limit:
+                self.env.ref(
+                    "prt_mail_messages.ir_cron_ptr_mail_messages_action_unlink"
+                )._trigger()
+                _logger.info("Trash purge: time limit reached, rescheduled")
+                break
+        duration = time.time() - start_time
+        _logger.info(
+            "Trash purge: %s messages deleted in %.2fs (%.1f messages/s)",
+            count,
+            duration,
+            count / duration if duration else count,
+        )
         return True
 
+    @api.model
+    def _get_trash_purge_time_limit(self):
+        """
+        Get time in seconds the empty trash cron may run
+        :return: float or None if time is not limited
+        """
+        return _get_cron_time_limit(TRASH_PURGE_TIME_LIMIT_RATIO)
+
     # -- Create
     @api.model_create_multi
     def create(self, vals_list):
         if self._name != "mail.message":
             return super().create(vals_list)
         # Update last message date if posting to Conversation
-        conversation_dict = dict()
-        for vals in vals_list:
-            if (
-                vals.get("model") == "cetmix.conversation"
-                and vals.get("message_type") != "notification"
-                and vals.get("author_id")
-            ):
-                conversation_dict[vals.get("res_id")] = vals.get("author_id")
+        write_date = fields.Datetime.now()
+        last_messages = {
+            vals.get("res_id"): (write_date, vals.get("author_id"))
+            for vals in vals_list
+            if vals.get("model") == "cetmix.conversation"
+            and vals.get("res_id")
+            and vals.get("message_type") not in CONVERSATION_EXCLUDED_MESSAGE_TYPES
+            and vals.get("author_id")
+        }
         messages = super().create(vals_list)
         conversation_obj = self.env["cetmix.conversation"]
-        write_date = fields.Datetime.now()
-        for conversation_id, author_id in conversation_dict.items():
-            conversation_obj.browse(conversation_id).write(
-                {
-                    "last_message_post": write_date,
-                    "last_message_by": author_id,
-                }
+        conversation_ids = messages.filtered(
+            lambda msg: msg.message_type not in CONVERSATION_EXCLUDED_MESSAGE_TYPES
+        )._get_conversation_ids()
+        if self.env["ir.config_parameter"]._get_cetmix_settings()[
+            "cetmix.conversation_last_message_postcommit"
+        ]:
+            conversation_obj._update_conversations_postcommit(
+                last_messages, conversation_ids
             )
+        else:
+            conversation_obj._update_last_message(last_messages)
+            # Update fields computed from messages
+            conversation_obj.browse(conversation_ids)._recompute_message_fields()
         return messages
 
+    def _get_conversation_ids(self):
+        """
+        Get ids of Conversations messages are posted to
+        :return: list of Conversation ids
+        """
+        return list(
+            {
+                msg.res_id
+                for msg in self.sudo()
+                if msg.model == "cetmix.conversation" and msg.res_id
+            }
+        )
+
     # -- Delete empty Conversations
     def _get_conversation_messages_to_delete_and_archive(self, conversation_ids):
-        conversations_2_archive = []
-        conversations_2_delete = []
-        for conversation in set(conversation_ids):
-            message_all = self.with_context(active_test=False).search(
+        """
+        Find Conversations with no messages or no active messages left.
+         Notifications are not considered!
+        All Conversations are checked with a single query.
+        :param conversation_ids: List of Conversation ids
+        :return: tuple (ids to archive, ids to delete)
+        """
+        conversation_ids = set(conversation_ids)
+        message_stats = {
+            res_id: has_active
+            for res_id, has_active in self.with_context(active_test=False)._read_group(
                 [
-                    ("res_id", "=", conversation),
+                    ("res_id", "in", list(conversation_ids)),
                     ("model", "=", "cetmix.conversation"),
-                    ("message_type", "!=", "notification"),
-                ]
+                    ("message_type", "not in", CONVERSATION_EXCLUDED_MESSAGE_TYPES),
+                ],
+                groupby=["res_id"],
+                aggregates=["active:bool_or"],
             )
-            message_active = message_all.filtered(lambda msg: msg.active)
-
-            if not message_all:
-                conversations_2_delete.append(conversation)
-            elif not message_active:
-                conversations_2_archive.append(conversation)
+        }
+        conversations_2_archive = [
+            conversation_id
+            for conversation_id, has_active in message_stats.items()
+            if not has_active
+        ]
+        conversations_2_delete = list(conversation_ids - set(message_stats))
         return conversations_2_archive, conversations_2_delete
 
     def _action_conversation_record(self, conversation_ids, action):
@@ -298,11 +597,13 @@ class MailMessage(models.Model):
             conversations_2_delete,
         ) = self._get_conversation_messages_to_delete_and_archive(conversation_ids)
         # Delete conversations with no messages
-        self._action_conversation_record(conversations_2_delete, "unlink")()
+        if conversations_2_delete:
+            self._action_conversation_record(conversations_2_delete, "unlink")()
         # Archive conversations
-        self._action_conversation_record(conversations_2_archive, "write")(
-            {"active": False}
-        )
+        if conversations_2_archive:
+            self._action_conversation_record(conversations_2_archive, "write")(
+                {"active": False}
+            )
 
     # -- Check delete rights
     def unlink_rights_check(self):
@@ -330,54 +631,57 @@ class MailMessage(models.Model):
             " Reason: %(reason)s"
         )
         partner_id = self.env.user.partner_id.id
-        for rec in self:
-            # Can delete if user:
-            # - Is Message Author for 'comment' message
-            # - Is the only 'recipient' for 'email' message
-            # Sent or Is Author?
-            if (
-                rec.message_type == "comment"
-                and not rec.author_allowed_id.id == partner_id
-            ):
-                raise AccessError(
-                    error_message
-                    % {
-                        "subject": rec.subject,
-                        "reason": _("You are not the message author"),
-                    }
-                )
+        # Can delete if user:
+        # - Is Message Author for 'comment' message
+        # - Is the only 'recipient' for 'email' message
+        forbidden = next(self._get_unlink_forbidden_reasons(partner_id), None)
+        if forbidden:
+            message_id, reason = forbidden
+            raise AccessError(
+                error_message
+                % {"subject": self.browse(message_id).subject, "reason": reason}
+            )
+        return True
 
-            # Received
-            if rec.message_type == "email":
-                # No recipients
-                if not rec.partner_ids:
-                    raise AccessError(
-                        error_message
-                        % {
-                            "subject": rec.subject,
-                            "reason": _("Message recipients undefined"),
-                        }
-                    )
-
-                # Has several recipients?
-                if len(rec.partner_ids) > 1:
-                    raise AccessError(
-                        error_message
-                        % {
-                            "subject": rec.subject,
-                            "reason": _("Message has multiple recipients"),
-                        }
-                    )
-
-                # Partner is not that one recipient
-                if not rec.partner_ids[0].id == partner_id:
-                    raise AccessError(
-                        error_message
-                        % {
-                            "subject": rec.subject,
-                            "reason": _("You are not the message recipient"),
-                        }
-                    )
+    def _get_unlink_forbidden_reasons(self, partner_id):
+        """
+        Find messages partner is not allowed to delete.
+        Messages are checked with a single query per batch.
+        :param int partner_id: id of the partner deleting messages
+        :return: generator of tuples (message id, reason)
+        """
+        self.flush_recordset(["message_type", "author_id", "partner_ids"])
+        for message_ids in split_every(MESSAGE_BATCH_SIZE, self.ids):
+            self._cr.execute(
+                """ SELECT mm.id, mm.message_type, mm.author_id,
+                        COUNT(rel.res_partner_id), MIN(rel.res_partner_id)
+                    FROM mail_message mm
+                    LEFT JOIN mail_message_res_partner_rel rel
+                        ON rel.mail_message_id = mm.id
+                    WHERE mm.id = ANY(%s)
+                    AND mm.message_type IN ('comment', 'email')
+                    GROUP BY mm.id """,
+                (list(message_ids),),
+            )
+            rows = {row[0]: row[1:] for row in self._cr.fetchall()}
+            # Keep original message order
+            for message_id in message_ids:
+                if message_id not in rows:
+                    continue
+                message_type, author_id, recipient_count, recipient_id = rows[
+                    message_id
+                ]
+                # Sent or Is Author?
+                if message_type == "comment":
+                    if author_id != partner_id:
+                        yield message_id, _("You are not the message author")
+                # Received
+                elif not recipient_count:
+                    yield message_id, _("Message recipients undefined")
+                elif recipient_count > 1:
+                    yield message_id, _("Message has multiple recipients")
+                elif recipient_id != partner_id:
+                    yield message_id, _("You are not the message recipient")
 
     def _messages_move_to_trash(self):
         """
@@ -386,14 +690,16 @@ class MailMessage(models.Model):
         """
         if not self:
             return
-        self.mark_read_multi()
-        self.write(
-            {
-                "active": False,
-                "delete_uid": self.env.user.id,
-                "delete_date": fields.Datetime.now(),
-            }
-        )
+        delete_date = fields.Datetime.now()
+        for messages in split_every(MESSAGE_BATCH_SIZE, self.ids, self.browse):
+            messages.mark_read_multi()
+            messages.write(
+                {
+                    "active": False,
+                    "delete_uid": self.env.user.id,
+                    "delete_date": delete_date,
+                }
+            )
 
     def _delete_trashed_messages(self):
         """
@@ -402,7 +708,8 @@ class MailMessage(models.Model):
         """
         if self:
             count = len(self)
-            self.unlink()
+            for messages in split_every(MESSAGE_BATCH_SIZE, self.ids, self.browse):
+                messages.unlink()
             _logger.info(
                 f"{count} message{'s'[:count ^ 1]} deleted from trash"
                 if count > 0
@@ -412,11 +719,7 @@ class MailMessage(models.Model):
     # -- Unlink
     def unlink_pro(self):
         # Store Conversation ids
-        conversation_ids = (
-            self.sudo()
-            .filtered(lambda r: r.model == "cetmix.conversation")
-            .mapped("res_id")
-        )
+        conversation_ids = self._get_conversation_ids()
         # Check access rights
         self.unlink_rights_check()
 
@@ -427,9 +730,7 @@ class MailMessage(models.Model):
         messages_to_delete._delete_trashed_messages()
 
         # Move to trash message
-        self.filtered(
-            lambda msg: msg.id not in messages_to_delete.ids
-        )._messages_move_to_trash()
+        (self - messages_to_delete)._messages_move_to_trash()
 
         self._delete_conversations(conversation_ids)
 
@@ -460,61 +761,61 @@ class MailMessage(models.Model):
     # and user has access to followers
     @api.depends("record_ref")
     def _compute_ref_partner_ids(self):
-        rec_vals = {}
-        # Compose dict of {model: [res_ids]}
-        # Will be used to check access rights to followers
+        # Group related records by model.
+        # Only models inheriting 'mail.thread' have followers
+        model_ids = defaultdict(set)
         for rec in self:
-            rec_model = rec.model
-            rec_res_id = rec.res_id
-            model_vals = rec_vals.get(rec_model, False)
-            if not model_vals:
-                rec_vals.update({rec_model: [rec_res_id]})
-            elif rec.res_id not in model_vals:
-                model_vals.append(rec_res_id)
-                rec_vals.update({rec_model: model_vals})
-
-        # Get followers for each "model:records"
-        follower_ids = set()
-        for model, ids in rec_vals.items():
-            if not model or not (
-                self.pool and issubclass(self.pool[model], self.pool["mail.thread"])
+            record_ref = rec.record_ref
+            if record_ref and issubclass(
+                self.pool[record_ref._name], self.pool["mail.thread"]
             ):
-                continue
-            follower_ids.update(
-                self.env[model]
-                .sudo()
-                .search([("id", "in", ids)])
-                .mapped("message_partner_ids")
-                .ids
+                model_ids[record_ref._name].add(record_ref.id)
+
+        # Get followers of all "model:records" with a single query
+        followers = defaultdict(set)
+        if model_ids:
+            self.env["mail.followers"].flush_model(
+                ["res_model", "res_id", "partner_id"]
             )
+            self._cr.execute(
+                """ SELECT res_model, res_id, partner_id FROM mail_followers
+                    WHERE res_model = ANY(%s) AND res_id = ANY(%s)
+                    AND partner_id IS NOT NULL """,
+                (
+                    list(model_ids),
+                    list(set().union(*model_ids.values())),
+                ),
+            )
+            for model, res_id, partner_id in self._cr.fetchall():
+                if res_id in model_ids[model]:
+                    followers[(model, res_id)].add(partner_id)
 
         # Filter only partners we have access to
-        follower_allowed_ids = self.env["res.partner"].search(
-            [("id", "in", list(follower_ids))]
+        follower_allowed_ids = set(
+            self.env["res.partner"]
+            .search([("id", "in", list(set().union(*followers.values())))])
+            .ids
         )
 
+        ResPartner = self.env["res.partner"]
         for rec in self:
-            if (
-                rec.record_ref
-                and self.pool
-                and issubclass(self.pool[rec.model], self.pool["mail.thread"])
-            ):
-                msg_partner_ids = rec.record_ref.sudo().message_partner_ids
-                rec.ref_partner_ids = msg_partner_ids.filtered(
-                    lambda p: p in follower_allowed_ids
-                )
-            else:
-                rec.ref_partner_ids = False
+            record_ref = rec.record_ref
+            partner_ids = (
+                followers.get((record_ref._name, record_ref.id), set())
+                if record_ref
+                else set()
+            )
+            rec.ref_partner_ids = ResPartner.browse(
+                sorted(partner_ids & follower_allowed_ids)
+            )
 
     def _get_message_preview(self, max_char=DEFAULT_MESSAGE_PREVIEW_LENGTH):
         """Customise message review by config parameter"""
-        max_preview = int(
-            self.env["ir.config_parameter"]
-            .sudo()
-            .get_param(
-                "cetmix.messages_easy_text_preview",
-                max_char,
-            )
+        max_preview = (
+            self.env["ir.config_parameter"]._get_cetmix_settings()[
+                "cetmix.messages_easy_text_preview"
+            ]
+            or max_char
         )
         return super()._get_message_preview(max_char=max_preview)
 
@@ -534,13 +835,25 @@ class MailMessage(models.Model):
     # -- Get Subject for tree view
     @api.depends("subject")
     def _compute_subject_display(self):
+        """
+        Compose HTML for Tree View.
+        Data from related records is fetched for all messages at once
+        so the number of queries does not depend on the number of messages
+        """
         # Get config data
-        ICPSudo = self.env["ir.config_parameter"].sudo()
+        settings = self.env["ir.config_parameter"]._get_cetmix_settings()
         # Get message subtype colors
-        messages_easy_color_note = ICPSudo.get_param(
-            "cetmix.messages_easy_color_note", default=False
-        )
+        messages_easy_color_note = settings["cetmix.messages_easy_color_note"]
         mt_note = self.env.ref("mail.mt_note").id
+        # Render avatars as links or inline images
+        avatars = _get_avatar_srcs(self.sudo().author_id, "avatar_128")
+        # Prefetch attachment names and related record names
+        attachment_names = {
+            msg.id: "&#013;".join(msg.attachment_ids.mapped("name"))
+            for msg in self.sudo()
+        }
+        record_names = self._get_record_ref_display_names()
+        now = fields.Datetime.now()
 
         # Compose subject
         for rec in self.with_context(bin_size=False):
@@ -550,9 +863,7 @@ class MailMessage(models.Model):
                 "starred": _("Starred"),
                 "has_error": _("Sending Error"),
                 "cx_edit_uid": rec.cx_edit_message,
-                "attachment_ids": "&#013;".join(
-                    [a.name for a in rec.sudo().attachment_ids]
-                ),
+                "attachment_ids": attachment_names[rec.id],
             }
             notification_icons = "".join(
                 reversed(
@@ -564,7 +875,8 @@ class MailMessage(models.Model):
                     ]
                 )
             )
-            message_date, date_display = _prepare_date_display(rec, rec.date)
+            message_date, date_display = _prepare_date_display(rec, rec.date, now)
+            record_ref = rec.record_ref
             rec.subject_display = TREE_TEMPLATE % {
                 "background_color": f"background-color:{messages_easy_color_note};"
                 if messages_easy_color_note and rec.subtype_id.id == mt_note
@@ -572,15 +884,14 @@ class MailMessage(models.Model):
                 "title": _("Internal Note")
                 if rec.subtype_id.id == mt_note
                 else _("Message"),
-                "avatar": rec.author_avatar.decode("utf-8")
-                if rec.author_avatar
-                else IMAGE_PLACEHOLDER,
+                "avatar": avatars[rec.sudo().author_id.id],
                 "author_display": html_escape(rec.author_display),
                 "subject": html_to_inner_content(rec.subject) if rec.subject else "",
                 "message_date": message_date.replace(tzinfo=None),
                 "date_display": date_display,
-                "record_ref": f"{rec.model_name}: {rec.record_ref.display_name}"
-                if rec.record_ref
+                "record_ref": f"{rec.model_name}: "
+                f"{record_names[(record_ref._name, record_ref.id)]}"
+                if record_ref
                 else "",
                 "icons": notification_icons,
                 "display_number_days_after_deletion": rec._display_number_days_after_deletion()  # noqa
@@ -588,6 +899,22 @@ class MailMessage(models.Model):
                 "body": rec.preview,
             }
 
+    def _get_record_ref_display_names(self):
+        """
+        Get display names of related records.
+        Names are computed with one batch per model
+        :return: dict {(model, res_id): display_name}
+        """
+        model_ids = defaultdict(set)
+        for rec in self:
+            if rec.record_ref:
+                model_ids[rec.record_ref._name].add(rec.record_ref.id)
+        return {
+            (model, record.id): record.display_name
+            for model, ids in model_ids.items()
+            for record in self.env[model].browse(ids)
+        }
+
     # -- Get Author for tree view
     @api.depends("author_allowed_id")
     def _compute_author_display(self):
@@ -602,38 +929,87 @@ class MailMessage(models.Model):
     # -- Count messages in same thread
     @api.depends("res_id")
     def _compute_thread_messages_count(self):
-        """Count messages in same thread"""
+        """
+        Count messages in same thread.
+        All threads of the recordset are counted with a single grouped query
+        """
+        thread_counts = self._get_thread_messages_count()
         for rec in self:
-            rec.thread_messages_count = self.search_count(
-                [
-                    "&",
-                    "&",
-                    ("model", "=", rec.model),
-                    ("res_id", "=", rec.res_id),
-                    ("message_type", "in", ["email", "comment"]),
-                ]
+            rec.thread_messages_count = thread_counts.get(
+                (rec.model or False, rec.res_id or False), 0
             )
 
+    def _get_thread_messages_count(self):
+        """
+        Count 'email' and 'comment' messages per thread of the recordset
+        :return: dict {(model, res_id): count}
+        """
+        if not self:
+            return {}
+        domain = [
+            ("model", "in", list({rec.model or False for rec in self})),
+            ("res_id", "in", list({rec.res_id or False for rec in self})),
+            ("message_type", "in", ["email", "comment"]),
+        ]
+        return {
+            (model or False, res_id or False): count
+            for model, res_id, count in self._read_group(
+                domain, groupby=["model", "res_id"], aggregates=["__count"]
+            )
+        }
+
     # -- Ref models
     @api.model
     def _referenceable_models(self):
         """List referencable Ref models"""
-        return [
+        return list(self._get_referenceable_models(self.env.lang))
+
+    @api.model
+    @ormcache("lang")
+    def _get_referenceable_models(self, lang):
+        """
+        Result is stored in the registry cache which is cleared
+         when models are installed or removed.
+        :param str lang: user language
+        :return: tuple of tuples (model, name)
+        """
+        return tuple(
             (x.model, x.name)
-            for x in self.env["ir.model"].sudo().search([("transient", "=", False)])
-        ]
+            for x in self.env["ir.model"]
+            .sudo()
+            .with_context(lang=lang)
+            .search([("transient", "=", False)])
+        )
 
     # -- Compose reference
     @api.depends("res_id")
     def _compute_record_ref(self):
+        records = self._get_record_refs()
+        for rec in self:
+            rec.record_ref = records.get((rec.model, rec.res_id), False)
+
+    def _get_record_refs(self):
+        """
+        Resolve related records grouped by model.
+        Access rights are checked once per model
+         and existence is checked with one query per model
+        :return: dict {(model, res_id): record}
+        """
+        model_ids = defaultdict(set)
         for rec in self:
             if rec.model and rec.res_id:
-                res = self.env[rec.model].browse(rec.res_id)
-                result = res.check_access_rights("read", raise_exception=False)
-                if result:
-                    rec.record_ref = res
-                    continue
-            rec.record_ref = False
+                model_ids[rec.model].add(rec.res_id)
+        records = {}
+        for model, ids in model_ids.items():
+            # Skip models left from uninstalled modules
+            if model not in self.env:
+                continue
+            Model = self.env[model]
+            if not Model.check_access_rights("read", raise_exception=False):
+                continue
+            for record in Model.browse(ids).exists():
+                records[(model, record.id)] = record
+        return records
 
     # -- Open messages of the same thread
     def thread_messages(self):
@@ -656,258 +1032,233 @@ class MailMessage(models.Model):
         }
 
     # -- Get forbidden models
+    @api.model
     def _get_forbidden_models(self):
-        # Use global vars
-        global GHOSTS_CHECKED
-        global FORBIDDEN_MODELS
-
-        # Ghosts checked?
-        if GHOSTS_CHECKED:
-            return FORBIDDEN_MODELS[:]
-
-        # Add transient models
-        FORBIDDEN_MODELS += (
-            self.env["ir.model"]
-            .sudo()
-            .search([("transient", "=", True)])
-            .mapped("model")
-        )
+        """
+        Return models messages of which are not shown in Messages Easy:
+        - predefined forbidden models
+        - transient models
+        - 'ghost' models. These are models left from uninstalled modules.
+        :return: list of model names
+        """
+        return list(self._get_forbidden_models_cached())
 
-        # Search for 'ghost' models. These are models left from uninstalled modules.
+    @api.model
+    @ormcache()
+    def _get_forbidden_models_cached(self):
+        """
+        Fetch forbidden models with a single query.
+        Result is stored in the registry cache which is cleared
+         when models are installed or removed.
+        :return: tuple of model names
+        """
+        self.env["ir.model"].flush_model(["model", "transient"])
+        self.env["ir.model.data"].flush_model(["model", "res_id"])
         self._cr.execute(
-            """ SELECT model FROM ir_model
-                                    WHERE transient = False
-                                    AND NOT model = ANY(%s) """,
-            (list(FORBIDDEN_MODELS),),
+            """
+            SELECT im.model FROM ir_model im
+            WHERE im.model = ANY(%s)
+               OR im.transient
+               OR NOT EXISTS (
+                    SELECT 1 FROM ir_model_data imd
+                    WHERE imd.model = 'ir.model' AND imd.res_id = im.id
+               )
+            """,
+            (FORBIDDEN_MODELS,),
+        )
+        return tuple(
+            sorted(set(FORBIDDEN_MODELS) | {row[0] for row in self._cr.fetchall()})
         )
-
-        # Check each model
-        for msg_model in self._cr.fetchall():
-            model = msg_model[0]
-            if not self.env["ir.model"].sudo().search([("model", "=", model)]).modules:
-                FORBIDDEN_MODELS.append(model)
-
-        # Mark as checked
-        GHOSTS_CHECKED = True
-        return FORBIDDEN_MODELS[:]
-
-    # -- Return allowed message ids and forbidden model list
-    @api.model
-    def _find_allowed_doc_ids_plus(self, model_ids):
-        IrModelAccess = self.env["ir.model.access"]
-        allowed_ids = set()
-        failed_models = []
-        for doc_model, doc_dict in model_ids.items():
-            if not IrModelAccess.check(doc_model, "read", False):
-                failed_models.append(doc_model)
-                continue
-            allowed_ids |= self._find_allowed_model_wise(doc_model, doc_dict)
-        return allowed_ids, failed_models
 
     # -- Search messages
-    def _search_messages(self, args, limit=None, order=None):
+    def _search_messages(self, domain, limit=None, order=None):
         """
-        This a shortcut function for mail.message model only
+        This a shortcut function for mail.message model only.
+        Record rules are applied but message access rules are not
+        :param list domain: search domain
+        :param int limit: max number of messages
+        :param str order: sort order
+        :return: list of tuples (id, model, res_id)
         """
-        if expression.is_false(self, args):
+        if expression.is_false(self, domain):
             # optimization: no need to query, as no record satisfies the domain
             return []
 
         # the flush must be done before the _where_calc(),
         # as the latter can do some selects
-        self._flush_search(args, order=order)
+        self._flush_search(domain, order=order)
 
-        query = self._where_calc(args)
+        query = self._where_calc(domain)
         self._apply_ir_rules(query, "read")
-        order_by = self._order_to_sql(order, query)
-        order_by = self.env.cr.mogrify(order_by).decode()
-        order_by = order_by and (' ORDER BY %s ' % order_by) or ''
-        from_clause, where_clause, where_clause_params = query.get_sql()
-
-        where_str = where_clause and (" WHERE %s" % where_clause) or ""
-
-        limit_str = limit and " limit %d" % limit or ""
-        query_str = (
-            'SELECT "mail_message".id,'
-            ' "mail_message".model,'
-            ' "mail_message".res_id FROM '
-            + from_clause
-            + where_str
-            + order_by
-            + limit_str
-        )  # noqa E8103
-        self._cr.execute(query_str, where_clause_params)
-        res = self._cr.fetchall()
-        return res
+        query.order = self._order_to_sql(order, query)
+        query.limit = limit
+        self._cr.execute(
+            query.select(
+                f'"{self._table}"."id"',
+                f'"{self._table}"."model"',
+                f'"{self._table}"."res_id"',
+            )
+        )
+        return self._cr.fetchall()
+
+    # -- Filter messages user has access to
+    def _filter_allowed_message_ids(self, message_ids):
+        """
+        Keep only messages user has access to
+        :param list message_ids: message ids
+        :return: list of allowed message ids in the original order
+        """
+        if self.env.is_superuser():
+            return message_ids
+        allowed_ids = set(
+            self.with_context(check_messages_access=False, active_test=False)
+            .search([("id", "in", message_ids)])
+            .ids
+        )
+        return [message_id for message_id in message_ids if message_id in allowed_ids]
+
+    # -- Count messages
+    def _search_messages_count(self, domain):
+        """
+        Count messages matching domain.
+        Record rules are applied but message access rules are not
+        :param list domain: search domain
+        :return: int
+        """
+        if expression.is_false(self, domain):
+            return 0
+        self._flush_search(domain)
+        query = self._where_calc(domain)
+        self._apply_ir_rules(query, "read")
+        self._cr.execute(query.select("COUNT(1)"))
+        return self._cr.fetchone()[0]
+
+    # -- Prepare keyset pagination
+    @api.model
+    def _prepare_keyset_pagination(self, domain, offset, limit, order):
+        """
+        Compose keyset pagination parameters from the previous page
+         passed in context: 'first_id', 'last_id' and 'last_offset'.
+        Optional 'list_count' (number of records shown in the pager)
+         tells if the requested page may be the last one
+        :param list domain: search domain
+        :param int offset: requested offset
+        :param int limit: page size
+        :param str order: requested order
+        :return: tuple (cursor domain, fetch order, reverse result, limit)
+         or None if keyset pagination cannot be used
+        """
+        order_spec = (order or self._order).lower().split()
+        if order_spec not in (["id", "desc"], ["id", "asc"]):
+            return None
+        descending = order_spec[1] == "desc"
+        order = "id desc" if descending else "id asc"
+        order_reversed = "id asc" if descending else "id desc"
+
+        # First page
+        if not offset:
+            return [], order, False, limit
+
+        first_id = self._context.get("first_id")
+        last_id = self._context.get("last_id")
+        last_offset = self._context.get("last_offset", 0)
+        if not (first_id and last_id):
+            return None
+
+        # Scrolling forward
+        if offset == last_offset + limit:
+            return [("id", "<" if descending else ">", last_id)], order, False, limit
+        # Scrolling back
+        if offset == last_offset - limit:
+            return (
+                [("id", ">" if descending else "<", first_id)],
+                order_reversed,
+                True,
+                limit,
+            )
+        # Returning from form view
+        if offset == last_offset:
+            return [("id", "<=" if descending else ">=", first_id)], order, False, limit
+        # Jumping to the last page.
+        # Pager count may be outdated, so it is only used to skip counting
+        #  when the requested page cannot be the last one
+        list_count = self._context.get("list_count")
+        if not list_count or not offset < list_count <= offset + limit:
+            return None
+        count = self._search_messages_count(domain)
+        if offset < count <= offset + limit:
+            return [], order_reversed, True, count - offset
+        return None
 
     # -- Override _search
-    # flake8: noqa: C901
-    # @api.model
-    # def _search(
-    #     self,
-    #     domain,
-    #     offset=0,
-    #     limit=None,
-    #     order=None,
-    #     access_rights_uid=None,
-    # ):
-    #     """Mail.message overrides generic '_search' defined in 'model' to
-    #      implement own logic for message access rights.
-    #     However sometimes this does not work for us because
-    #      we would like to show only messages posted to the records
-    #     user actually has access to
-    #     Following key in context is used:
-    #     - 'check_messages_access': if not set legacy 'search' is performed
-    #     For the moment we do not show messages posted to mail.channel
-    #      Model (Discussion Channels)
-    #     Finally we check the following:
-    #     After having received ids of a classic search, keep only:
-    #     - uid has access to related record
-    #     - otherwise: remove the id
-    #     """
-    #     # Skip if not using our own _search
-    #     if not self._context.get("check_messages_access", False):
-    #         return super()._search(
-    #             domain=domain,
-    #             offset=offset,
-    #             limit=limit,
-    #             order=order,
-    #             access_rights_uid=access_rights_uid,
-    #         )
-    #     # Rules do not apply to administrator
-    #     if self.env.is_superuser():
-    #         return super()._search(
-    #             domain,
-    #             offset=offset,
-    #             limit=limit,
-    #             order=order,
-    #             access_rights_uid=access_rights_uid,
-    #         )
-    #     # Non-employee see only messages with a subtype (aka, no internal logs)
-    #     if not self.env.user.has_group("base.group_user"):
-    #         subtype_domain = [
-    #             ("subtype_id", "!=", False),
-    #             ("subtype_id.internal", "=", False),
-    #         ]
-    #         domain = expression.AND([subtype_domain, list(domain)])
-    #
-    #     # Get forbidden models
-    #     forbidden_models = self._get_forbidden_models()
-    #
-    #     # Remaining amount of records we need to fetch
-    #     limit_remaining = limit
-    #
-    #     # List of filtered ids we return
-    #     id_list = []
-    #
-    #     # id of the last message fetched
-    #     # (in case we need to perform more fetches to fill the limit)
-    #     last_id = False
-    #     # Scrolling message list pages back (arrow left)
-    #     scroll_back = False
-    #     search_args = False
-    #     count = False
-    #     # Fetch messages
-    #     while limit_remaining if limit else True:
-    #         # Check which records are we trying to fetch
-    #         # Skip for count
-    #         if not count:
-    #             # For initial query only
-    #             if not last_id:
-    #                 # If fetching not the first page or performing search_count
-    #                 if offset != 0:
-    #                     last_offset = self._context.get("last_offset", 0)
-    #
-    #                     # Scrolling back
-    #                     if offset < last_offset:
-    #                         scroll_back = True
-    #                         search_args = ("id", ">", self._context["first_id"])
-    #                         order = "id asc"
-    #
-    #                     # Scrolling reverse from first to last page
-    #                     elif last_offset == 0 and offset / limit > 1:
-    #                         scroll_back = True
-    #                         order = "id asc"
-    #
-    #                     # Scrolling forward
-    #                     elif offset > last_offset:
-    #                         search_args = ("id", "<", self._context["last_id"])
-    #                         order = "id desc"
-    #
-    #                     # Returning from form view
-    #                     else:
-    #                         search_args = ("id", "<=", self._context["first_id"])
-    #                         order = "id desc"
-    #                 else:
-    #                     search_args = False
-    #
-    #             # Post fetching records
-    #             else:
-    #                 if scroll_back:
-    #                     search_args = ("id", ">", last_id)
-    #                     order = "id asc"
-    #                 else:
-    #                     search_args = ("id", "<", last_id)
-    #                     order = "id desc"
-    #
-    #         # Check for forbidden models and compose final args
-    #         if search_args and len(forbidden_models) > 0:
-    #             model_domain = expression.AND(
-    #                 [[("model", "not in", forbidden_models)], [search_args]]
-    #             )
-    #             query_args = expression.AND([model_domain, list(domain)])
-    #         elif search_args:
-    #             query_args = expression.AND([[search_args], list(domain)])
-    #         elif len(forbidden_models) > 0:
-    #             query_args = expression.AND(
-    #                 [[("model", "not in", forbidden_models)], list(domain)]
-    #             )
-    #         else:
-    #             query_args = domain
-    #
-    #         # Get messages (id, model, res_id)
-    #         res = self._search_messages(
-    #             args=query_args, limit=limit_remaining if limit else limit, order=order
-    #         )
-    #
-    #         # All done, no more messages left
-    #         if len(res) == 0:
-    #             break
-    #
-    #         # Check model access
-    #         model_ids = {}
-    #         for m_id, rmod, rid in res:
-    #             if rmod and rid:
-    #                 model_ids.setdefault(rmod, {}).setdefault(rid, set()).add(m_id)
-    #
-    #         allowed_ids, failed_models = self._find_allowed_doc_ids_plus(model_ids)
-    #
-    #         # Append to list of allowed ids,
-    #         # re-construct a list based on ids,
-    #         # because set did not keep the original order
-    #         sorted_ids = [msg[0] for msg in res if msg[0] in allowed_ids]
-    #
-    #         if len(sorted_ids) > 0:
-    #             id_list += sorted_ids
-    #
-    #         # Break if search was initially limitless
-    #         if not limit:
-    #             break
-    #
-    #         # Add failed models to forbidden models
-    #         if len(failed_models) > 0:
-    #             forbidden_models += failed_models
-    #
-    #         # Set last id
-    #         last_id = res[-1][0]
-    #
-    #         # Deduct remaining amount
-    #         limit_remaining -= len(allowed_ids)
-    #
-    #     if count:
-    #         return len(id_list)
-    #     else:
-    #         return reversed(id_list) if scroll_back else id_list
+    @api.model
+    def _search(
+        self,
+        domain,
+        offset=0,
+        limit=None,
+        order=None,
+        access_rights_uid=None,
+    ):
+        """
+        Mail.message overrides generic '_search' defined in 'model' to
+         implement own logic for message access rights.
+        However sometimes this does not work for us because
+         we would like to show only messages posted to the records
+         user actually has access to and keep the pages full.
+        Following key in context is used:
+        - 'check_messages_access': if not set legacy 'search' is performed
+        Pages are fetched relatively to the first or last message
+         of the previous page (keyset pagination) instead of using OFFSET,
+         so the cost of a page does not depend on its number.
+        For the moment we do not show messages posted to forbidden models.
+        Messages user has no access to are removed from the page
+         and the page is refilled with the following messages
+         using a bounded number of fetches.
+        """
+        check_messages_access = self._context.get("check_messages_access")
+        # Exclude forbidden models from pages and counts
+        if check_messages_access:
+            forbidden_models = self._get_forbidden_models()
+            if forbidden_models:
+                domain = expression.AND(
+                    [[("model", "not in", forbidden_models)], list(domain)]
+                )
+        keyset = (
+            check_messages_access
+            and limit
+            and not access_rights_uid
+            and self._prepare_keyset_pagination(domain, offset, limit, order)
+        )
+        if not keyset:
+            return super()._search(
+                domain,
+                offset=offset,
+                limit=limit,
+                order=order,
+                access_rights_uid=access_rights_uid,
+            )
+        self.check_access_rights("read")
+        cursor, fetch_order, reverse, limit = keyset
+        descending = fetch_order == "id desc"
+
+        id_list = []
+        for __ in range(MESSAGES_SEARCH_MAX_FETCH):
+            res = self._search_messages(
+                expression.AND([cursor, list(domain)]), limit=limit, order=fetch_order
+            )
+            message_ids = [row[0] for row in res]
+            id_list += self._filter_allowed_message_ids(message_ids)[
+                : limit - len(id_list)
+            ]
+            # Page is full or no more messages left
+            if len(id_list) >= limit or len(res) < limit:
+                break
+            cursor = [("id", "<" if descending else ">", message_ids[-1])]
+
+        if reverse:
+            id_list.reverse()
+        return self.browse(id_list)._as_query()
 
     # -- Prepare context for reply or quote message
     def reply_prep_context(self):
@@ -981,10 +1332,50 @@ class MailMessage(models.Model):
         }
 
     def write(self, vals):
+        messages = self
         if vals.get("active") and not self._context.get("undelete_action"):
-            new_self = self.filtered(lambda r: not r.delete_uid and not r.delete_date)
-            return super(MailMessage, new_self).write(vals)
-        return super().write(vals)
+            messages = self.filtered(lambda r: not r.delete_uid and not r.delete_date)
+        # Conversations to update fields computed from messages for
+        update_conversations = bool(CONVERSATION_TRACKED_FIELDS.intersection(vals))
+        conversation_ids = (
+            messages._get_conversation_ids() if update_conversations else []
+        )
+        result = super(MailMessage, messages).write(vals)
+        messages._update_message_inbox(vals)
+        if update_conversations:
+            conversation_ids += messages._get_conversation_ids()
+            self.env["cetmix.conversation"].browse(
+                list(set(conversation_ids))
+            )._recompute_message_fields()
+        return result
+
+    def _update_message_inbox(self, vals):
+        """
+        Update inbox rows after messages are starred or moved to trash
+        :param dict vals: values written to messages
+        """
+        MessageInbox = self.env["cetmix.message.inbox"].sudo()
+        if "starred_partner_ids" in vals:
+            commands = vals["starred_partner_ids"]
+            # Only inboxes of linked or unlinked partners are affected
+            partner_ids = None
+            if all(
+                isinstance(command, (list, tuple))
+                and command[0] in (Command.LINK, Command.UNLINK)
+                for command in commands
+            ):
+                partner_ids = [command[1] for command in commands]
+            MessageInbox._refresh(self.ids, partner_ids)
+        if "delete_uid" in vals:
+            MessageInbox._refresh_trashed(self.ids)
+
+    def unlink(self):
+        conversations = self.env["cetmix.conversation"].browse(
+            self._get_conversation_ids()
+        )
+        result = super().unlink()
+        conversations._recompute_message_fields()
+        return result
 
     def _can_edit_by_group(self, all_, own):
         """
@@ -0,0 +1,65 @@
+###################################################################################
+#
+#    Copyright (C) 2020 Cetmix OÜ
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU LESSER GENERAL PUBLIC LICENSE as
+#    published by the Free Software Foundation, either version 3 of the
+#    License, or (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU LESSER GENERAL PUBLIC LICENSE for more details.
+#
+#    You should have received a copy of the GNU LESSER GENERAL PUBLIC LICENSE
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+###################################################################################
+
+
+from odoo import api, models
+
+# Notification fields stored in message inbox
+INBOX_TRACKED_FIELDS = {"is_read", "mail_message_id", "res_partner_id"}
+
+
+class MailNotification(models.Model):
+    _inherit = "mail.notification"
+
+    def _refresh_message_inbox(self, message_ids=(), partner_ids=()):
+        """
+        Rebuild inbox rows of notified partners
+        :param message_ids: additional mail.message ids
+        :param partner_ids: additional res.partner ids
+        """
+        notifications = self.sudo()
+        self.env["cetmix.message.inbox"].sudo()._refresh(
+            set(notifications.mail_message_id.ids).union(message_ids),
+            set(notifications.res_partner_id.ids).union(partner_ids),
+        )
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        notifications = super().create(vals_list)
+        notifications._refresh_message_inbox()
+        return notifications
+
+    def write(self, vals):
+        if not INBOX_TRACKED_FIELDS.intersection(vals):
+            return super().write(vals)
+        # Inbox rows of previous partners and messages are updated too
+        notifications = self.sudo()
+        message_ids = notifications.mail_message_id.ids
+        partner_ids = notifications.res_partner_id.ids
+        result = super().write(vals)
+        self._refresh_message_inbox(message_ids, partner_ids)
+        return result
+
+    def unlink(self):
+        notifications = self.sudo()
+        message_ids = notifications.mail_message_id.ids
+        partner_ids = notifications.res_partner_id.ids
+        result = super().unlink()
+        self.browse()._refresh_message_inbox(message_ids, partner_ids)
+        return result
@@ -38,8 +38,8 @@ class MailThread(models.AbstractModel):
 
     def _notify_get_recipients(self, message, msg_vals, **kwargs):
         recipients_data = super()._notify_get_recipients(message, msg_vals, **kwargs)
-        ICPSudo = self.env["ir.config_parameter"].sudo()
-        if ICPSudo.get_param("cetmix.mail_incoming_smart_notify"):
+        settings = self.env["ir.config_parameter"]._get_cetmix_settings()
+        if settings["cetmix.mail_incoming_smart_notify"]:
             if self._context.get("skip_notification"):
                 return []  # Skip all notification
             # Filtering notification recipients
@@ -62,11 +62,9 @@ class MailThread(models.AbstractModel):
     def message_route(
         self, message, message_dict, model=None, thread_id=None, custom_values=None
     ):
-        allow_direct_message = (
-            self.env["ir.config_parameter"]
-            .sudo()
-            .get_param("cetmix.allow_direct_messages_to_catchall", False)
-        )
+        allow_direct_message = self.env["ir.config_parameter"]._get_cetmix_settings()[
+            "cetmix.allow_direct_messages_to_catchall"
+        ]
         if allow_direct_message:
             return super(
                 MailThread, self.with_context(allow_catchall=True)
@@ -0,0 +1,147 @@
+###################################################################################
+#
+#    Copyright (C) 2020 Cetmix OÜ
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU LESSER GENERAL PUBLIC LICENSE as
+#    published by the Free Software Foundation, either version 3 of the
+#    License, or (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU LESSER GENERAL PUBLIC LICENSE for more details.
+#
+#    You should have received a copy of the GNU LESSER GENERAL PUBLIC LICENSE
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+###################################################################################
+
+
+from odoo import api, fields, models
+from odoo.tools import create_index, index_exists
+
+# Partial indexes used by inbox filters: {name: (expressions, where)}
+INBOX_INDEXES = {
+    "cetmix_message_inbox_unread_index": (["partner_id", "message_id"], "NOT is_read"),
+    "cetmix_message_inbox_starred_index": (["partner_id", "message_id"], "is_starred"),
+}
+
+
+class MessageInbox(models.Model):
+    """
+    Inbox state of messages per partner.
+    One row per partner notified about or starring a message.
+    Rows are rebuilt from notifications, stars and trash state
+     when those are changed, so inbox filters do not need
+     to join notifications and stars of all users.
+    """
+
+    _name = "cetmix.message.inbox"
+    _description = "Message Inbox"
+    _log_access = False
+
+    _sql_constraints = [
+        (
+            "partner_message_unique",
+            "UNIQUE(partner_id, message_id)",
+            "Message can be present in partner inbox only once!",
+        )
+    ]
+
+    partner_id = fields.Many2one(
+        comodel_name="res.partner", required=True, ondelete="cascade"
+    )
+    message_id = fields.Many2one(
+        comodel_name="mail.message", required=True, ondelete="cascade", index=True
+    )
+    is_read = fields.Boolean(string="Read")
+    is_starred = fields.Boolean(string="Starred")
+    is_trashed = fields.Boolean(string="Trashed")
+
+    def init(self):
+        for name, (expressions, where) in INBOX_INDEXES.items():
+            if not index_exists(self._cr, name):
+                create_index(self._cr, name, self._table, expressions, where=where)
+        # Fill inbox when module is installed on existing database
+        self._cr.execute(f"SELECT 1 FROM {self._table} LIMIT 1")
+        if not self._cr.fetchone():
+            self._refresh()
+
+    @api.model
+    def _refresh(self, message_ids=None, partner_ids=None):
+        """
+        Rebuild inbox rows from notifications, stars and trash state
+        :param message_ids: mail.message ids, all messages if not set
+        :param partner_ids: res.partner ids, all partners if not set
+        """
+        if message_ids is not None and not message_ids:
+            return
+        self.env["mail.notification"].flush_model(
+            ["is_read", "mail_message_id", "res_partner_id"]
+        )
+        self.env["mail.message"].flush_model(["delete_uid", "starred_partner_ids"])
+        params = {
+            "message_ids": list(message_ids or []),
+            "partner_ids": list(partner_ids or []),
+        }
+
+        def where(message_column, partner_column):
+            conditions = ["TRUE"]
+            if message_ids is not None:
+                conditions.append(f"{message_column} = ANY(%(message_ids)s)")
+            if partner_ids is not None:
+                conditions.append(f"{partner_column} = ANY(%(partner_ids)s)")
+            return " AND ".join(conditions)
+
+        # Rows of partners who are not notified anymore are removed
+        self._cr.execute(
+            f"DELETE FROM {self._table} WHERE {where('message_id', 'partner_id')}",
+            params,
+        )
+        self._cr.execute(
+            f"""INSERT INTO {self._table}
+                    (partner_id, message_id, is_read, is_starred, is_trashed)
+                SELECT src.partner_id, src.message_id, bool_and(src.is_read),
+                    bool_or(src.is_starred), msg.delete_uid IS NOT NULL
+                FROM (
+                    SELECT res_partner_id AS partner_id,
+                        mail_message_id AS message_id,
+                        COALESCE(is_read, FALSE) AS is_read,
+                        FALSE AS is_starred
+                    FROM mail_notification
+                    WHERE res_partner_id IS NOT NULL
+                        AND {where('mail_message_id', 'res_partner_id')}
+                    UNION ALL
+                    SELECT res_partner_id, mail_message_id, TRUE, TRUE
+                    FROM mail_message_res_partner_starred_rel
+                    WHERE {where('mail_message_id', 'res_partner_id')}
+                ) src
+                JOIN mail_message msg ON msg.id = src.message_id
+                GROUP BY src.partner_id, src.message_id, msg.delete_uid
+                ON CONFLICT (partner_id, message_id) DO UPDATE
+                SET is_read = EXCLUDED.is_read,
+                    is_starred = EXCLUDED.is_starred,
+                    is_trashed = EXCLUDED.is_trashed""",
+            params,
+        )
+        self.invalidate_model()
+        self.env["mail.message"].invalidate_model(["cx_inbox_ids"])
+
+    @api.model
+    def _refresh_trashed(self, message_ids):
+        """
+        Update trash state of messages in all inboxes
+        :param message_ids: mail.message ids
+        """
+        if not message_ids:
+            return
+        self.env["mail.message"].flush_model(["delete_uid"])
+        self._cr.execute(
+            f"""UPDATE {self._table} inbox
+                SET is_trashed = msg.delete_uid IS NOT NULL
+                FROM mail_message msg
+                WHERE msg.id = inbox.message_id AND msg.id = ANY(%s)""",
+            (list(message_ids),),
+        )
+        self.invalidate_model(["is_trashed"])
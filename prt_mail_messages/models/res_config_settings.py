@@ -17,9 +17,15 @@
 #
 ###################################################################################
 
-from odoo import fields, models
+from odoo import api, fields, models
 
-from .common import DEFAULT_SIGNATURE_LOCATION
+from .common import (
+    CONVERSATION_QUEUE_BATCH_SIZE,
+    CONVERSATION_QUEUE_MAX_ATTEMPTS,
+    DEFAULT_SEARCH_LANGUAGE,
+    DEFAULT_SIGNATURE_LOCATION,
+    TRASH_PURGE_BATCH_SIZE,
+)
 
 
 ###################
@@ -42,6 +48,13 @@ class ResConfigSettings(models.TransientModel):
         config_parameter="cetmix.messages_easy_empty_trash",
         default=0,
     )
+    messages_easy_empty_trash_batch_size = fields.Integer(
+        string="Empty trash batch size",
+        help="Number of messages deleted at once. "
+        "Changes are committed after each batch",
+        config_parameter="cetmix.messages_easy_empty_trash_batch_size",
+        default=TRASH_PURGE_BATCH_SIZE,
+    )
     mail_incoming_smart_notify = fields.Boolean(
         string="Smart Notification",
         help="Do not notify followers "
@@ -69,3 +82,62 @@ class ResConfigSettings(models.TransientModel):
     allow_direct_messages_to_catchall = fields.Boolean(
         config_parameter="cetmix.allow_direct_messages_to_catchall"
     )
+    messages_easy_avatar_url = fields.Boolean(
+        string="Avatar links",
+        help="Render avatars in List Views as cacheable image links "
+        "instead of embedding images into each row",
+        config_parameter="cetmix.messages_easy_avatar_url",
+    )
+    conversation_last_message_postcommit = fields.Boolean(
+        string="Deferred Conversation updates",
+        help="Update Conversation last message, its author and message counter "
+        "after the message is committed. "
+        "Until then the Conversation shows previous values",
+        config_parameter="cetmix.conversation_last_message_postcommit",
+    )
+    conversation_deferred_processing = fields.Boolean(
+        string="Deferred incoming email processing",
+        help="Create partners for unknown addresses of incoming Conversations "
+        "later by cron. Partners created later are not notified "
+        "about the first message",
+        config_parameter="cetmix.conversation_deferred_processing",
+    )
+    conversation_deferred_batch_size = fields.Integer(
+        string="Emails processed at once",
+        config_parameter="cetmix.conversation_deferred_batch_size",
+        default=CONVERSATION_QUEUE_BATCH_SIZE,
+    )
+    conversation_deferred_max_attempts = fields.Integer(
+        string="Attempts",
+        help="Email is marked as failed after this number of attempts",
+        config_parameter="cetmix.conversation_deferred_max_attempts",
+        default=CONVERSATION_QUEUE_MAX_ATTEMPTS,
+    )
+
+    messages_easy_search_language = fields.Selection(
+        selection="_get_search_languages",
+        string="Text search language",
+        help="Language used to find words in messages by full-text search",
+        config_parameter="cetmix.messages_easy_search_language",
+        default=DEFAULT_SEARCH_LANGUAGE,
+    )
+
+    @api.model
+    def _get_search_languages(self):
+        return [
+            (language, language.capitalize())
+            for language in self.env["mail.message"]._get_search_languages()
+        ]
+
+    def set_values(self):
+        ICP = self.env["ir.config_parameter"]
+        settings = ICP._get_cetmix_settings()
+        res = super().set_values()
+        new_settings = ICP._get_cetmix_settings()
+        # Full-text search index depends on language
+        if (
+            settings["cetmix.messages_easy_search_language"]
+            != new_settings["cetmix.messages_easy_search_language"]
+        ):
+            self.env["mail.message"]._update_indexes()
+        return res
@@ -17,7 +17,7 @@
 #
 ###################################################################################
 
-from odoo import api, fields, models
+from odoo import api, fields, models, tools
 
 
 ################
@@ -33,21 +33,102 @@ class Partner(models.Model):
         string="Messages To", compute="_compute_messages_count"
     )
 
+    def _auto_init(self):
+        res = super()._auto_init()
+        # Used to find partners by email case insensitive
+        tools.create_index(
+            self._cr, "res_partner_lower_email_index", self._table, ["lower(email)"]
+        )
+        return res
+
+    def write(self, vals):
+        # Stars may be changed from partner side (e.g. 'unstar_all')
+        starred_message_ids = []
+        if "starred_message_ids" in vals:
+            starred_message_ids = self.sudo().starred_message_ids.ids
+        result = super().write(vals)
+        if "starred_message_ids" in vals:
+            self.flush_recordset(["starred_message_ids"])
+            self.env["cetmix.message.inbox"].sudo()._refresh(
+                set(starred_message_ids + self.sudo().starred_message_ids.ids),
+                self.ids,
+            )
+        return result
+
     def _compute_messages_count(self):
-        """Compute count messages from/to"""
-        MailMessage = self.env["mail.message"]
+        """
+        Compute count messages from/to.
+        Messages are counted for all partners at once:
+         'from' counts include messages of child partners.
+        """
+        partner_ids = self._origin.ids
+        from_counts = self._get_messages_from_count(partner_ids)
+        to_counts = self._get_messages_to_count(partner_ids)
         for rec in self:
             rec.update(
                 {
-                    "messages_from_count": MailMessage.search_count(
-                        self._prepare_message_domain(record_from_id=rec.id)
-                    ),
-                    "messages_to_count": MailMessage.search_count(
-                        self._prepare_message_domain(record_to_ids=rec.ids)
-                    ),
+                    "messages_from_count": from_counts.get(rec._origin.id, 0),
+                    "messages_to_count": to_counts.get(rec._origin.id, 0),
                 }
             )
 
+    @api.model
+    def _get_messages_from_count(self, partner_ids):
+        """
+        Count messages authored by partners or their child partners
+        :param list partner_ids: partner ids
+        :return: dict {partner_id: count}
+        """
+        if not partner_ids:
+            return {}
+        # Resolve child partners once for all partners.
+        # Archived and restricted children are kept, same as
+        #  'child_of' used in the 'Messages From' domain
+        children = (
+            self.with_context(active_test=False)
+            .sudo()
+            .search_fetch([("id", "child_of", partner_ids)], ["parent_path"])
+        )
+        partner_ids = set(partner_ids)
+        author_parents = {
+            child.id: [
+                int(parent_id)
+                for parent_id in child.parent_path.split("/")
+                if parent_id and int(parent_id) in partner_ids
+            ]
+            for child in children
+        }
+        counts = dict.fromkeys(partner_ids, 0)
+        for author, count in self.env["mail.message"]._read_group(
+            self._prepare_message_domain()
+            + [("author_id", "in", list(author_parents))],
+            groupby=["author_id"],
+            aggregates=["__count"],
+        ):
+            for parent_id in author_parents.get(author.id, []):
+                counts[parent_id] += count
+        return counts
+
+    @api.model
+    def _get_messages_to_count(self, partner_ids):
+        """
+        Count messages partners are recipients of
+        :param list partner_ids: partner ids
+        :return: dict {partner_id: count}
+        """
+        if not partner_ids:
+            return {}
+        partner_ids_set = set(partner_ids)
+        return {
+            partner.id: count
+            for partner, count in self.env["mail.message"]._read_group(
+                self._prepare_message_domain(record_to_ids=partner_ids),
+                groupby=["partner_ids"],
+                aggregates=["__count"],
+            )
+            if partner.id in partner_ids_set
+        }
+
     @api.model
     def _prepare_message_domain(self, record_to_ids=None, record_from_id=None):
         """Prepare message domain to display"""
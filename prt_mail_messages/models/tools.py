@@ -17,12 +17,16 @@
 #
 ###################################################################################
 
+import logging
 from datetime import datetime
 
 from odoo import _
 from odoo.fields import Datetime
+from odoo.tools import config
 
-from .common import IMAGE_PLACEHOLDER, MONTHS
+from .common import AVATAR_PLACEHOLDER_URL, IMAGE_PLACEHOLDER, MONTHS
+
+_logger = logging.getLogger(__name__)
 
 
 def _get_decode_image(image):
@@ -32,6 +36,51 @@ def _get_decode_image(image):
     return IMAGE_PLACEHOLDER
 
 
+def _get_image_src(image):
+    """Compose 'src' attribute value for inline image"""
+    return f"data:image/png;base64,{_get_decode_image(image)}"
+
+
+def _use_avatar_url(env):
+    """Check if avatars are rendered as links instead of inline images"""
+    return env["ir.config_parameter"]._get_cetmix_settings()[
+        "cetmix.messages_easy_avatar_url"
+    ]
+
+
+def _get_avatar_srcs(partners, image_field="image_128"):
+    """
+    Compose 'src' attribute values for partner avatars.
+    If enabled, cacheable image links are used for partners
+     the current user can read. Other avatars are embedded as images
+     read with superuser rights, because links to them would be broken.
+    :param partners: res.partner recordset
+    :param str image_field: image field used for embedded images
+    :return: dict {partner_id: src}. Placeholder is stored under False key
+    """
+    use_avatar_url = _use_avatar_url(partners.env)
+    partners = partners.sudo().with_context(bin_size=False)
+    linked_ids = set()
+    if use_avatar_url and partners:
+        user_partners = partners.sudo(False)
+        if user_partners.check_access_rights("read", raise_exception=False):
+            linked_ids = set(user_partners._filter_access_rules("read").ids)
+    # Fetch embedded images with a single query
+    embedded = partners.filtered(lambda partner: partner.id not in linked_ids)
+    embedded.fetch([image_field])
+    srcs = {False: AVATAR_PLACEHOLDER_URL if use_avatar_url else _get_image_src(False)}
+    for partner in partners:
+        if partner.id not in linked_ids:
+            srcs[partner.id] = _get_image_src(partner[image_field])
+            continue
+        # Link is updated when partner image or name is changed
+        unique = partner.write_date and partner.write_date.strftime("%Y%m%d%H%M%S")
+        srcs[
+            partner.id
+        ] = f"/web/image/res.partner/{partner.id}/avatar_128?unique={unique or ''}"
+    return srcs
+
+
 def sanitize_name(name):
     """In case name contains @. Use to keep html working"""
     if not name:
@@ -39,9 +88,16 @@ def sanitize_name(name):
     return name.split("@")[0] if "@" in name else name
 
 
-def _prepare_date_display(record, date):
-    """Compose displayed date/time"""
-    now = Datetime.context_timestamp(record, Datetime.now())
+def _prepare_date_display(record, date, now=None):
+    """
+    Compose displayed date/time
+    :param record: record used to get user timezone
+    :param datetime date: date to display
+    :param datetime now: current date. Pass it when composing dates
+     for several records to get the same result for all of them
+    :return: tuple (message date in user timezone, displayed date)
+    """
+    now = Datetime.context_timestamp(record, now or Datetime.now())
     message_date = Datetime.context_timestamp(record, date)
     days_diff = (now.date() - message_date.date()).days
     date_format = datetime.strftime(message_date, "%H:%M")
@@ -89,3 +145,53 @@ def _prepare_notification(
     if attachment_ids:
         notification_icons = ' &nbsp;<i class="fa fa-paperclip" title="%s"></i>' % title
     return notification_icons
+
+
+def _create_indexes_concurrently(registry, table, indexes, obsolete=()):
+    """
+    Create missing indexes without locking the table.
+    Invalid indexes left by interrupted builds are re-created.
+    Concurrent build cannot run inside a transaction,
+     so a separate cursor in autocommit mode is used.
+    :param registry: registry of the database
+    :param str table: table name
+    :param dict indexes: {index name: index definition}
+    :param list obsolete: names of indexes to drop once new ones are built
+    """
+    with registry.cursor() as cr:
+        cr._cnx.autocommit = True
+        try:
+            cr.execute(
+                """ SELECT c.relname, i.indisvalid FROM pg_index i
+                    JOIN pg_class c ON c.oid = i.indexrelid
+                    WHERE c.relname = ANY(%s) """,
+                (list(indexes),),
+            )
+            existing = dict(cr.fetchall())
+            for name, definition in indexes.items():
+                if existing.get(name):
+                    continue
+                if name in existing:
+                    cr.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {name}")
+                _logger.info("Creating index %s", name)
+                cr.execute(
+                    f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} "
+                    f"ON {table} USING {definition}"
+                )
+            for name in obsolete:
+                _logger.info("Dropping index %s", name)
+                cr.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {name}")
+        finally:
+            cr._cnx.autocommit = False
+
+
+def _get_cron_time_limit(ratio):
+    """
+    Get time in seconds a cron may run before it is killed
+    :param float ratio: part of the worker time limit to use
+    :return: float or None if time is not limited
+    """
+    time_limit = config.get("limit_time_real_cron", -1)
+    if time_limit is None or time_limit < 0:
+        time_limit = config.get("limit_time_real")
+    return time_limit * ratio if time_limit else None
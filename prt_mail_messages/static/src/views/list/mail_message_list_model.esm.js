@@ -22,8 +22,11 @@ export class MailMessageUpdateRecordList extends MailMessageUpdateListModel.Dyna
                 first_id: this.records[0].resId,
                 last_id: this.records[rec_len - 1].resId,
                 last_offset: this.last_offset,
-                list_count: this.count,
             };
+            // Count is used to detect jumps to the last page
+            if (!this.hasLimitedCount) {
+                extraContext.list_count = this.count;
+            }
         }
         const kwargs = {
             limit: this.limit,
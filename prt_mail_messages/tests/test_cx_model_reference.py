@@ -25,6 +25,7 @@ class TestCxModelReference(MailMessageCommon):
     TEST 1 : Check 'custom_name' field value
     TEST 2 : Check selection value
     TEST 3 : Check referenceable models list
+    TEST 4 : Check referenceable models are cached
     """
 
     def setUp(self):
@@ -193,3 +194,24 @@ class TestCxModelReference(MailMessageCommon):
             ["res.partner", "cetmix.conversation"],
             msg="Models list must be the same",
         )
+
+    # -- TEST 4 : Check referenceable models are cached
+    def test_referenceable_models_cache(self):
+        """Check referenceable models are cached and cache is invalidated"""
+        CxModelReference = self.env["cx.model.reference"]
+        MailMessage = self.env["mail.message"]
+        CxModelReference.referenceable_models()
+        message_models = MailMessage._referenceable_models()
+        with self.assertQueryCount(0):
+            CxModelReference.referenceable_models()
+            self.assertEqual(
+                MailMessage._referenceable_models(),
+                message_models,
+                msg="Models list must be the same",
+            )
+        self.cx_model_reference_partner.custom_name = "Partner"
+        self.assertEqual(
+            dict(CxModelReference.referenceable_models())["res.partner"],
+            "Partner",
+            msg="Custom name must be equal to 'Partner'",
+        )
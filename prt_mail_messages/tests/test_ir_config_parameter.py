@@ -29,3 +29,19 @@ class TestIrConfigParameter(TransactionCase):
             "mail.catchall.alias", False
         )
         self.assertFalse(result)
+
+    def test_get_cetmix_settings(self):
+        ICP = self.env["ir.config_parameter"].sudo()
+        ICP.set_param("cetmix.message_quote_number", "3")
+        ICP.set_param("cetmix.mail_incoming_smart_notify", True)
+        settings = ICP._get_cetmix_settings()
+        self.assertEqual(
+            settings["cetmix.message_quote_number"], 3, "Result must be equal to 3"
+        )
+        self.assertIs(settings["cetmix.mail_incoming_smart_notify"], True)
+        with self.assertQueryCount(0):
+            ICP._get_cetmix_settings()
+        ICP.set_param("cetmix.mail_incoming_smart_notify", False)
+        self.assertIs(
+            ICP._get_cetmix_settings()["cetmix.mail_incoming_smart_notify"], False
+        )
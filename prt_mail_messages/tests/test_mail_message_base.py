@@ -17,6 +17,12 @@
 #
 ###################################################################################
 
+from contextlib import nullcontext
+from datetime import timedelta
+from unittest.mock import patch
+
+from odoo import fields
+
 from .common import MailMessageCommon
 
 
@@ -81,3 +87,142 @@ class TestMailMessageBase(MailMessageCommon):
             msg_conversation_2.author_id.id,
             msg=f"Last message author ID must be equal to {self.res_partner_kate.id}",
         )
+
+    def test_create_conversation_message_last_message(self):
+        """Conversation last message is updated once and never moves back"""
+        conversation = self.env["cetmix.conversation"].create(
+            {"name": "Conversation #1"}
+        )
+        self.env["mail.message"].create(
+            [
+                {
+                    "author_id": author.id,
+                    "body": f"Message from {author.name}",
+                    "res_id": conversation.id,
+                    "model": conversation._name,
+                }
+                for author in (self.res_partner_ann, self.res_partner_kate)
+            ]
+        )
+        self.assertEqual(
+            conversation.last_message_by.id,
+            self.res_partner_kate.id,
+            msg=f"Last message author ID must be equal to {self.res_partner_kate.id}",
+        )
+        last_message_post = fields.Datetime.now() + timedelta(days=1)
+        conversation.write({"last_message_post": last_message_post})
+        self.env["mail.message"].create(
+            {
+                "author_id": self.res_partner_ann.id,
+                "body": "Message #3",
+                "res_id": conversation.id,
+                "model": conversation._name,
+            }
+        )
+        self.assertEqual(
+            conversation.last_message_post,
+            last_message_post,
+            msg="Last message date must not be overwritten by older date",
+        )
+        self.assertEqual(
+            conversation.last_message_by.id,
+            self.res_partner_kate.id,
+            msg=f"Last message author ID must be equal to {self.res_partner_kate.id}",
+        )
+
+    def test_create_conversation_message_last_message_postcommit(self):
+        """Conversation is updated after commit"""
+        self.env["ir.config_parameter"].sudo().set_param(
+            "cetmix.conversation_last_message_postcommit", True
+        )
+        conversation = self.env["cetmix.conversation"].create(
+            {"name": "Conversation #1"}
+        )
+        self.env.flush_all()
+        self.env.cr.postcommit.clear()
+        self.env["mail.message"].create(
+            [
+                {
+                    "author_id": author.id,
+                    "body": f"Message from {author.name}",
+                    "res_id": conversation.id,
+                    "model": conversation._name,
+                }
+                for author in (self.res_partner_ann, self.res_partner_kate)
+            ]
+        )
+        self.env.flush_all()
+        self.env.cr.execute(
+            """ SELECT message_count, last_message_id, last_message_by
+                FROM cetmix_conversation WHERE id = %s """,
+            (conversation.id,),
+        )
+        self.assertEqual(
+            self.env.cr.fetchone(),
+            (0, None, None),
+            msg="Conversation must not be updated before commit",
+        )
+        # Post-commit hook opens a new cursor that would not see
+        #  uncommitted test data, so the test cursor is used instead
+        with patch.object(
+            type(self.env.registry),
+            "cursor",
+            autospec=True,
+            return_value=nullcontext(self.env.cr),
+        ):
+            self.env.cr.postcommit.run()
+        conversation.invalidate_recordset()
+        self.assertEqual(
+            conversation.last_message_by.id,
+            self.res_partner_kate.id,
+            msg=f"Last message author ID must be equal to {self.res_partner_kate.id}",
+        )
+        self.assertTrue(
+            conversation.last_message_post, msg="Last message date must be set"
+        )
+        self.assertEqual(
+            conversation.message_count, 2, msg="Messages count must be equal to 2"
+        )
+        self.assertEqual(
+            conversation.last_message_author_id.id,
+            self.res_partner_kate.id,
+            msg=f"Last message author ID must be equal to {self.res_partner_kate.id}",
+        )
+
+    def test_bulk_message_actions(self):
+        """Mark as read, star and archive several messages at once"""
+        messages = self.mail_message_parent | self.mail_message_test_1
+        partner = self.env.user.partner_id
+        # Mark as read
+        self.env["mail.notification"].create(
+            {
+                "mail_message_id": self.mail_message_parent.id,
+                "res_partner_id": partner.id,
+                "notification_type": "inbox",
+                "is_read": False,
+            }
+        )
+        messages.invalidate_recordset(["needaction"])
+        self.assertTrue(
+            self.mail_message_parent.needaction, msg="Message must need action"
+        )
+        self.mail_message_test_1.mark_read_multi()
+        messages.invalidate_recordset(["needaction"])
+        self.assertFalse(
+            self.mail_message_parent.needaction,
+            msg="Parent message must be marked as read",
+        )
+        # Star
+        self.mail_message_parent.star_multi()
+        messages.star_multi()
+        self.assertFalse(
+            self.mail_message_parent.starred, msg="Message must not be starred"
+        )
+        self.assertTrue(self.mail_message_test_1.starred, msg="Message must be starred")
+        # Archive
+        self.mail_message_parent.archive()
+        messages.archive()
+        self.assertTrue(self.mail_message_parent.active, msg="Message must be active")
+        self.assertFalse(
+            self.mail_message_test_1.active, msg="Message must be archived"
+        )
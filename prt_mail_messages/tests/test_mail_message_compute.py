@@ -0,0 +1,347 @@
+###################################################################################
+#
+#    Copyright (C) 2020 Cetmix OÜ
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU LESSER GENERAL PUBLIC LICENSE as
+#    published by the Free Software Foundation, either version 3 of the
+#    License, or (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU LESSER GENERAL PUBLIC LICENSE for more details.
+#
+#    You should have received a copy of the GNU LESSER GENERAL PUBLIC LICENSE
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+###################################################################################
+
+from odoo.tests import tagged
+
+from odoo.addons.prt_mail_messages.models.tools import _get_avatar_srcs
+
+from .common import MailMessageCommon
+
+
+@tagged("post_install", "-at_install")
+class TestMailMessageCompute(MailMessageCommon):
+    """
+    TEST 1 : Thread messages count
+        - Kate thread messages count: 3
+        - Ann thread messages count: 1
+        - Conversation thread messages count: 1
+
+    TEST 2 : Thread messages count query count
+        - Query count for 2 messages is equal to query count for 12 messages
+
+    TEST 3 : Subject display avatar links
+        [Disable avatar links]
+        - subject display contains inline image
+        [Enable avatar links]
+        - subject display contains avatar link
+        - subject display is smaller than with inline image
+
+    TEST 4 : Subject display query count
+        - Query count for 2 messages is equal to query count for 12 messages
+
+    TEST 5 : Record reference
+        - Kate message record reference is Kate
+        [Create message for deleted partner]
+        - message record reference is empty
+        - message subject display is composed
+
+    TEST 6 : Related record followers
+        [Subscribe Bob and Ann to Kate]
+        - Kate message followers contain Bob and Ann
+        - Conversation message followers don't contain Bob
+        - Query count for 2 messages is equal to query count for 12 messages
+
+    TEST 7 : Partner messages count
+        [Create Kate's contact and post message from contact to Ann]
+        - Partner messages from/to counts are equal to search counts
+        - Kate messages from count includes contact messages
+        [Archive Kate's contact]
+        - Kate messages from count includes archived contact messages
+        - Query count for 2 partners is equal to query count for 3 partners
+
+    TEST 8 : Avatar links for restricted partners
+        [Enable avatar links]
+        [Move Bob to another company]
+        - Ann avatar is a link with 'unique' based on write date
+        - Bob avatar is embedded for Test User #1
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        MailMessage = cls.env["mail.message"]
+        cls.mail_message_kate = MailMessage.create(
+            {
+                "author_id": cls.res_partner_bob.id,
+                "body": "Test Body Kate",
+                "message_type": "comment",
+                "res_id": cls.res_partner_kate.id,
+                "model": cls.res_partner_kate._name,
+            }
+        )
+        cls.mail_message_ann = MailMessage.create(
+            {
+                "author_id": cls.res_partner_bob.id,
+                "body": "Test Body Ann",
+                "message_type": "comment",
+                "res_id": cls.res_partner_ann.id,
+                "model": cls.res_partner_ann._name,
+            }
+        )
+        cls.messages_bulk = MailMessage.create(
+            [
+                {
+                    "author_id": cls.res_partner_bob.id,
+                    "body": f"Test Body Bulk #{index}",
+                    "message_type": "comment",
+                    "res_id": cls.res_partner_mark.id,
+                    "model": cls.res_partner_mark._name,
+                }
+                for index in range(10)
+            ]
+        )
+
+    def _count_queries(self, messages, field_name):
+        """
+        Count SQL queries needed to compute field for messages
+        :param messages: mail.message recordset
+        :param str field_name: name of the computed field
+        :return: int
+        """
+        messages.mapped("model")
+        messages.mapped("res_id")
+        messages.invalidate_recordset([field_name])
+        start_count = self.env.cr.sql_log_count
+        messages.mapped(field_name)
+        return self.env.cr.sql_log_count - start_count
+
+    # -- TEST 1 : Thread messages count
+    def test_thread_messages_count(self):
+        """Thread messages count"""
+        messages = (
+            self.mail_message_parent
+            | self.mail_message_test_1
+            | self.mail_message_kate
+            | self.mail_message_ann
+            | self.mail_message_test_conversation
+        )
+        messages.invalidate_recordset(["thread_messages_count"])
+        self.assertEqual(
+            self.mail_message_kate.thread_messages_count,
+            3,
+            msg="Messages count must be equal to 3",
+        )
+        self.assertEqual(
+            self.mail_message_ann.thread_messages_count,
+            1,
+            msg="Messages count must be equal to 1",
+        )
+        self.assertEqual(
+            self.mail_message_test_conversation.thread_messages_count,
+            1,
+            msg="Messages count must be equal to 1",
+        )
+
+    # -- TEST 2 : Thread messages count query count
+    def test_thread_messages_count_queries(self):
+        """Thread messages count query count does not depend on page size"""
+        messages_small = self.mail_message_kate | self.mail_message_ann
+        messages_large = messages_small | self.messages_bulk
+        self.assertEqual(
+            self._count_queries(messages_small, "thread_messages_count"),
+            self._count_queries(messages_large, "thread_messages_count"),
+            msg="Query count must not depend on number of messages",
+        )
+        self.assertEqual(
+            self.messages_bulk[0].thread_messages_count,
+            10,
+            msg="Messages count must be equal to 10",
+        )
+
+    # -- TEST 3 : Subject display avatar links
+    def test_subject_display_avatar_url(self):
+        """Subject display renders avatar links instead of inline images"""
+        ICPSudo = self.env["ir.config_parameter"].sudo()
+        message = self.mail_message_kate
+        ICPSudo.set_param("cetmix.messages_easy_avatar_url", False)
+        message.invalidate_recordset(["subject_display"])
+        subject_display_inline = message.subject_display
+        self.assertIn(
+            "data:image/png;base64,",
+            subject_display_inline,
+            msg="Subject display must contain inline image",
+        )
+        ICPSudo.set_param("cetmix.messages_easy_avatar_url", True)
+        message.invalidate_recordset(["subject_display"])
+        subject_display_url = message.subject_display
+        self.assertIn(
+            f"/web/image/res.partner/{self.res_partner_bob.id}/avatar_128?unique=",
+            subject_display_url,
+            msg="Subject display must contain avatar link",
+        )
+        self.assertLess(
+            len(subject_display_url),
+            len(subject_display_inline),
+            msg="Subject display with avatar link must be smaller",
+        )
+
+    # -- TEST 4 : Subject display query count
+    def test_subject_display_queries(self):
+        """Subject display query count does not depend on page size"""
+        messages_small = self.mail_message_kate | self.mail_message_ann
+        messages_large = messages_small | self.messages_bulk
+        # Warm up caches not related to messages
+        messages_large.mapped("subject_display")
+        self.env.invalidate_all()
+        self.assertEqual(
+            self._count_queries(messages_small, "subject_display"),
+            self._count_queries(messages_large, "subject_display"),
+            msg="Query count must not depend on number of messages",
+        )
+
+    # -- TEST 5 : Record reference
+    def test_record_ref(self):
+        """Record reference is resolved for existing records only"""
+        self.assertEqual(
+            self.mail_message_kate.record_ref,
+            self.res_partner_kate,
+            msg="Record reference must be equal to Kate",
+        )
+        partner = self.env["res.partner"].create({"name": "Deleted Partner"})
+        partner_id = partner.id
+        partner.unlink()
+        message = self.env["mail.message"].create(
+            {
+                "author_id": self.res_partner_bob.id,
+                "body": "Test Body Deleted",
+                "message_type": "comment",
+                "res_id": partner_id,
+                "model": "res.partner",
+            }
+        )
+        self.assertFalse(message.record_ref, msg="Record reference must be empty")
+        self.assertIn(
+            "Test Body Deleted",
+            message.subject_display,
+            msg="Subject display must contain message body",
+        )
+
+    # -- TEST 6 : Related record followers
+    def test_ref_partner_ids(self):
+        """Related record followers are computed with a fixed number of queries"""
+        self.res_partner_kate.message_subscribe(
+            [self.res_partner_bob.id, self.res_partner_ann.id]
+        )
+        messages = self.mail_message_kate | self.mail_message_test_conversation
+        messages.invalidate_recordset(["ref_partner_ids"])
+        self.assertIn(
+            self.res_partner_bob,
+            self.mail_message_kate.ref_partner_ids,
+            msg="Followers must contain Bob",
+        )
+        self.assertIn(
+            self.res_partner_ann,
+            self.mail_message_kate.ref_partner_ids,
+            msg="Followers must contain Ann",
+        )
+        self.assertNotIn(
+            self.res_partner_bob,
+            self.mail_message_test_conversation.ref_partner_ids,
+            msg="Followers must not contain Bob",
+        )
+        messages_small = self.mail_message_kate | self.mail_message_ann
+        messages_large = messages_small | self.messages_bulk
+        self.assertEqual(
+            self._count_queries(messages_small, "ref_partner_ids"),
+            self._count_queries(messages_large, "ref_partner_ids"),
+            msg="Query count must not depend on number of messages",
+        )
+
+    # -- TEST 7 : Partner messages count
+    def test_partner_messages_count(self):
+        """Partner messages count is computed for all partners at once"""
+        ResPartner = self.env["res.partner"]
+        MailMessage = self.env["mail.message"]
+        contact = ResPartner.create(
+            {"name": "Kate Contact", "parent_id": self.res_partner_kate.id}
+        )
+        MailMessage.create(
+            {
+                "author_id": contact.id,
+                "body": "Test Body Contact",
+                "message_type": "comment",
+                "partner_ids": [(4, self.res_partner_ann.id)],
+                "res_id": self.res_partner_ann.id,
+                "model": self.res_partner_ann._name,
+            }
+        )
+        partners = self.res_partner_kate | self.res_partner_ann | self.res_partner_bob
+        partners.invalidate_recordset(["messages_from_count", "messages_to_count"])
+        for partner in partners:
+            self.assertEqual(
+                partner.messages_from_count,
+                MailMessage.search_count(
+                    ResPartner._prepare_message_domain(record_from_id=partner.id)
+                ),
+                msg="Messages from count must be equal to search count",
+            )
+            self.assertEqual(
+                partner.messages_to_count,
+                MailMessage.search_count(
+                    ResPartner._prepare_message_domain(record_to_ids=partner.ids)
+                ),
+                msg="Messages to count must be equal to search count",
+            )
+        self.assertEqual(
+            self.res_partner_kate.messages_from_count,
+            1,
+            msg="Messages from count must be equal to 1",
+        )
+        contact.active = False
+        self.res_partner_kate.invalidate_recordset(["messages_from_count"])
+        self.assertEqual(
+            self.res_partner_kate.messages_from_count,
+            1,
+            msg="Messages from archived contact must be counted",
+        )
+        query_counts = []
+        for records in (self.res_partner_kate | self.res_partner_ann, partners):
+            records.mapped("parent_path")
+            records.invalidate_recordset(["messages_from_count", "messages_to_count"])
+            start_count = self.env.cr.sql_log_count
+            records.mapped("messages_from_count")
+            query_counts.append(self.env.cr.sql_log_count - start_count)
+        self.assertEqual(
+            query_counts[0],
+            query_counts[1],
+            msg="Query count must not depend on number of partners",
+        )
+
+    # -- TEST 8 : Avatar links for restricted partners
+    def test_avatar_srcs_restricted_partner(self):
+        """Avatars of partners user cannot read are embedded"""
+        self.env["ir.config_parameter"].sudo().set_param(
+            "cetmix.messages_easy_avatar_url", True
+        )
+        self.res_partner_bob.company_id = self.env["res.company"].create(
+            {"name": "Other Company"}
+        )
+        ann = self.res_partner_ann
+        partners = (ann | self.res_partner_bob).with_user(self.test_user)
+        avatars = _get_avatar_srcs(partners)
+        self.assertEqual(
+            avatars[ann.id],
+            f"/web/image/res.partner/{ann.id}/avatar_128"
+            f"?unique={ann.write_date.strftime('%Y%m%d%H%M%S')}",
+            msg="Ann avatar must be a link",
+        )
+        self.assertTrue(
+            avatars[self.res_partner_bob.id].startswith("data:image/png;base64,"),
+            msg="Bob avatar must be embedded",
+        )
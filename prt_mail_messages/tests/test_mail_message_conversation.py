@@ -17,9 +17,22 @@
 #
 ###################################################################################
 
+from unittest.mock import patch
+
 from odoo import fields
+from odoo.exceptions import UserError
 from odoo.tests import common
 
+DEFERRED_EMAIL = """From: Sender <deferred.sender@example.com>
+To: test.partner@example.com
+Cc: Receiver <deferred.receiver@example.com>
+Subject: Deferred email
+Message-Id: <deferred.email@example.com>
+Content-Type: text/plain; charset="utf-8"
+
+Deferred email body
+"""
+
 
 @common.tagged("post_install", "-at_install", "test_conversation")
 class TestMailMessageConversation(common.TransactionCase):
@@ -109,6 +122,111 @@ class TestMailMessageConversation(common.TransactionCase):
         [Get partner by list :
         ["test.partner@example.com", "partner.example@example.com"]]
         - result: Partner must be equal to Partner 'test.partner@example.com'
+
+    TEST - 10 : Conversation message counter is maintained
+        - conversation message_count must be equal to 2
+        [Move message #1 to trash]
+        - conversation message_count must be equal to 1
+        [Undelete message #1]
+        - conversation message_count must be equal to 2
+        [Break counter and run recompute cron]
+        - conversation message_count must be equal to 2
+
+    TEST - 11 : Conversation Tree View cache is updated
+        - conversation display cache doesn't contain 'Test Partner #1'
+        [Add 'Test Partner #1' to participants]
+        - conversation display cache contains 'Test Partner #1'
+        [Post message 'Cached preview' to conversation]
+        - conversation display cache contains 'Cached preview'
+        - conversation subject display contains 'Cached preview'
+        - conversation display cache doesn't contain images
+        [Enable avatar links]
+        - conversation subject display contains participant avatar link
+
+    TEST - 12 : Empty trash in batches
+        [Set config delete trash days = 1 and batch size = 1]
+        [Move to trash conversation message #1 and #2]
+        [Unlink messages by cron from trash]
+        - message #1 not found
+        - message #2 not found
+        - conversation not found
+
+    TEST - 13 : Participants are synchronized with followers
+        [Add 'Test Partner #1' to conversations #1 and #2 participants]
+        - 'Test Partner #1' follows conversations #1 and #2
+        [Remove 'Test Partner #1' from conversations #1 and #2 participants]
+        - 'Test Partner #1' doesn't follow conversations #1 and #2
+
+    TEST - 14 : Archive and unarchive conversations
+        [Post message to conversation #2]
+        [Archive conversations #1 and #2]
+        - conversations messages are archived
+        [Unarchive conversations #1 and #2]
+        - conversations messages are active
+
+    TEST - 15 : Get or create partners by several emails
+        [Prepare partner ids for 'TEST.PARTNER@example.com'
+         and 'new.partner@example.com' twice]
+        - 'Test Partner #1' is found case insensitive
+        - single partner is created for 'new.partner@example.com'
+
+    TEST - 16 : Conversation last message is maintained
+        [Post message 'Latest message' to conversation #2]
+        - last message is the new message
+        - last message preview contains 'Latest message'
+        - last message author is 'Test Partner #1'
+        [Archive new message]
+        - last message is the previous message
+        [Unarchive and move new message to conversation #1]
+        - conversation #2 last message is the previous message
+        - conversation #1 last message is the moved message
+        [Delete moved message]
+        - conversation #1 last message is not the moved message
+
+    TEST - 17 : Deferred processing of incoming emails
+        [Enable deferred processing]
+        [Receive email from 'Sender' to 'Test Partner #1' and 'Receiver']
+        - 'Test Partner #1' is participant and follower at once
+        - message has no author
+        - email is queued
+        [Run queue cron]
+        - queue is empty
+        - 'Sender' and 'Receiver' partners are created
+        - conversation and message author is 'Sender'
+        - 'Sender', 'Receiver' and 'Test Partner #1' are participants
+        - 'Sender', 'Receiver' and 'Test Partner #1' are followers
+
+    TEST - 18 : Failed processing of incoming emails is retried
+        [Set max attempts = 2 and queue emails for conversations #1 and #2]
+        [Run queue cron with conversation #1 email failing]
+        - conversation #2 email is processed
+        - conversation #1 email is pending with 1 attempt and error
+        [Run queue cron again]
+        - conversation #1 email is failed with 2 attempts
+        [Retry failed email]
+        - email is pending with no attempts and error
+        [Run queue cron]
+        - queue is empty
+
+    TEST - 19 : Partners found by email are not outdated
+        [Get partner id by email 'test.partner@example.com']
+        - partner id is equal to 'Test Partner #1' id
+        [Change 'Test Partner #1' email]
+        - partner is not found by old email
+        [Override 'partner_by_email' to find 'Test Partner #1' by any email]
+        - 'Test Partner #1' is returned for unknown email
+        - no partner is created
+        [Get or create partners for several unknown emails]
+        - partners are searched by email once
+
+    TEST - 20 : Empty trash stops when messages are not deleted
+        [Set config delete trash days = 1 and batch size = 1]
+        [Move to trash conversation message #1 and #2]
+        [Override 'unlink_pro' to keep messages]
+        [Unlink messages by cron from trash]
+        - each message is processed once
+        - messages are not deleted
+        - no message is counted as deleted
     """
 
     def setUp(self):
@@ -476,3 +594,397 @@ class TestMailMessageConversation(common.TransactionCase):
             self.res_partner_test_1.id,
             msg=f"Conversation Author ID must be equal to {self.res_partner_test_1.id}",
         )
+
+    # TEST - 10 : Conversation message counter is maintained
+    def test_conversation_message_count_maintained(self):
+        """Conversation message counter is maintained"""
+        conversation = self.cetmix_conversation_1
+        self.assertEqual(
+            conversation.message_count, 2, msg="Messages count must be equal to 2"
+        )
+        self.mail_message_1.unlink_pro()
+        self.assertEqual(
+            conversation.message_count, 1, msg="Messages count must be equal to 1"
+        )
+        self.mail_message_1.undelete()
+        self.assertEqual(
+            conversation.message_count, 2, msg="Messages count must be equal to 2"
+        )
+        self.env.cr.execute(
+            "UPDATE cetmix_conversation SET message_count = 0 WHERE id = %s",
+            (conversation.id,),
+        )
+        conversation.invalidate_recordset(["message_count"])
+        self.env["cetmix.conversation"]._cron_recompute_message_fields()
+        self.assertEqual(
+            conversation.message_count, 2, msg="Messages count must be equal to 2"
+        )
+
+    # TEST - 11 : Conversation Tree View cache is updated
+    def test_conversation_subject_display_cache(self):
+        """Conversation Tree View cache is updated"""
+        conversation = self.cetmix_conversation_2
+        partner = self.res_partner_test_1
+        participant = [partner.id, partner.name]
+        self.assertNotIn(
+            participant,
+            conversation.subject_display_cache["participants"],
+            msg=f"Participants must not contain '{partner.name}'",
+        )
+        conversation.write({"partner_ids": [(4, partner.id)]})
+        self.assertIn(
+            participant,
+            conversation.subject_display_cache["participants"],
+            msg=f"Participants must contain '{partner.name}'",
+        )
+        self.env["mail.message"].create(
+            {
+                "res_id": conversation.id,
+                "model": "cetmix.conversation",
+                "email_from": "test.from@example.com",
+                "body": "Cached preview",
+            }
+        )
+        self.assertIn(
+            "Cached preview",
+            conversation.subject_display_cache["last_message"]["body"],
+            msg="Preview must contain 'Cached preview'",
+        )
+        self.assertIn(
+            "Cached preview",
+            conversation.subject_display,
+            msg="Subject display must contain 'Cached preview'",
+        )
+        self.assertNotIn(
+            "base64",
+            str(conversation.subject_display_cache),
+            msg="Display cache must not contain images",
+        )
+        # Avatars are rendered on read, so no recompute is needed
+        self.env["ir.config_parameter"].sudo().set_param(
+            "cetmix.messages_easy_avatar_url", True
+        )
+        conversation.invalidate_recordset(["subject_display"])
+        self.assertIn(
+            f"/web/image/res.partner/{partner.id}/avatar_128?unique=",
+            conversation.subject_display,
+            msg="Subject display must contain participant avatar link",
+        )
+
+    # TEST - 12 : Empty trash in batches
+    def test_unlink_trash_message_batch(self):
+        """Empty trash in batches"""
+        ICPSudo = self.env["ir.config_parameter"].sudo()
+        ICPSudo.set_param("cetmix.messages_easy_empty_trash", 1)
+        ICPSudo.set_param("cetmix.messages_easy_empty_trash_batch_size", 1)
+        messages = self.mail_message_1 | self.mail_message_2
+        messages.unlink_pro()
+        self.env["mail.message"]._unlink_trash_message(
+            test_custom_datetime=fields.Datetime.now()
+        )
+        self.assertFalse(messages.exists(), msg="Messages must be deleted")
+        self.assertFalse(
+            self.cetmix_conversation_1.exists(), msg="Conversation must be deleted"
+        )
+
+    # TEST - 13 : Participants are synchronized with followers
+    def test_conversation_followers_sync(self):
+        """Participants are synchronized with followers"""
+        conversations = self.cetmix_conversation_1 | self.cetmix_conversation_2
+        partner = self.res_partner_test_1
+        conversations.write({"partner_ids": [(4, partner.id)]})
+        for conversation in conversations:
+            self.assertIn(
+                partner,
+                conversation.message_partner_ids,
+                msg=f"Followers must contain '{partner.name}'",
+            )
+        conversations.write({"partner_ids": [(3, partner.id)]})
+        for conversation in conversations:
+            self.assertNotIn(
+                partner,
+                conversation.message_partner_ids,
+                msg=f"Followers must not contain '{partner.name}'",
+            )
+
+    # TEST - 14 : Archive and unarchive conversations
+    def test_conversation_archive_messages(self):
+        """Archive and unarchive conversations"""
+        conversations = self.cetmix_conversation_1 | self.cetmix_conversation_2
+        self.env["mail.message"].create(
+            {
+                "res_id": self.cetmix_conversation_2.id,
+                "model": "cetmix.conversation",
+                "email_from": "test.from@example.com",
+                "body": "Archive me",
+            }
+        )
+        messages = self._get_messages_by_conversation_id(
+            self.cetmix_conversation_1.id
+        ) | self._get_messages_by_conversation_id(self.cetmix_conversation_2.id)
+        messages = messages.filtered(lambda msg: msg.model == "cetmix.conversation")
+        conversations.write({"active": False})
+        self.assertFalse(
+            any(messages.mapped("active")), msg="Messages must be archived"
+        )
+        conversations.write({"active": True})
+        self.assertTrue(all(messages.mapped("active")), msg="Messages must be active")
+
+    # TEST - 15 : Get or create partners by several emails
+    def test_prepare_partner_ids(self):
+        """Get or create partners by several emails"""
+        ResPartner = self.env["res.partner"]
+        partner_ids = self.env["cetmix.conversation"].prepare_partner_ids(
+            "TEST.PARTNER@example.com, New Partner <new.partner@example.com>, "
+            "new.partner@example.com"
+        )
+        new_partner = ResPartner.search([("email", "=", "new.partner@example.com")])
+        self.assertEqual(len(new_partner), 1, msg="Single partner must be created")
+        self.assertEqual(
+            partner_ids,
+            {self.res_partner_test_1.id, new_partner.id},
+            msg="Partner ids must be equal",
+        )
+
+    # TEST - 16 : Conversation last message is maintained
+    def test_conversation_last_message(self):
+        """Conversation last message is maintained"""
+        conversation = self.cetmix_conversation_2
+        previous_message = conversation.last_message_id
+        message = self.env["mail.message"].create(
+            {
+                "res_id": conversation.id,
+                "model": "cetmix.conversation",
+                "author_id": self.res_partner_test_1.id,
+                "body": "Latest message",
+            }
+        )
+        self.assertEqual(
+            conversation.last_message_id,
+            message,
+            msg="Last message must be the new message",
+        )
+        self.assertIn(
+            "Latest message",
+            conversation.last_message_preview,
+            msg="Preview must contain 'Latest message'",
+        )
+        self.assertEqual(
+            conversation.last_message_author_id,
+            self.res_partner_test_1,
+            msg="Last message author must be 'Test Partner #1'",
+        )
+        message.write({"active": False})
+        self.assertEqual(
+            conversation.last_message_id,
+            previous_message,
+            msg="Last message must be the previous message",
+        )
+        message.write({"active": True, "res_id": self.cetmix_conversation_1.id})
+        self.assertEqual(
+            conversation.last_message_id,
+            previous_message,
+            msg="Last message must be the previous message",
+        )
+        self.assertEqual(
+            self.cetmix_conversation_1.last_message_id,
+            message,
+            msg="Last message must be the moved message",
+        )
+        message.unlink()
+        self.assertTrue(
+            self.cetmix_conversation_1.last_message_id,
+            msg="Last message must be set",
+        )
+        self.assertNotEqual(
+            self.cetmix_conversation_1.last_message_id.id,
+            message.id,
+            msg="Last message must not be the deleted message",
+        )
+
+    # TEST - 17 : Deferred processing of incoming emails
+    def test_conversation_deferred_processing(self):
+        """Deferred processing of incoming emails"""
+        ResPartner = self.env["res.partner"]
+        ConversationQueue = self.env["cetmix.conversation.queue"]
+        self.env["ir.config_parameter"].sudo().set_param(
+            "cetmix.conversation_deferred_processing", True
+        )
+        conversation_id = self.env["mail.thread"].message_process(
+            "cetmix.conversation", DEFERRED_EMAIL
+        )
+        conversation = self.env["cetmix.conversation"].browse(conversation_id)
+        message = conversation.message_ids.filtered(
+            lambda msg: msg.message_id == "<deferred.email@example.com>"
+        )
+        self.assertEqual(
+            conversation.partner_ids,
+            self.res_partner_test_1,
+            msg="Participant must be 'Test Partner #1'",
+        )
+        self.assertIn(
+            self.res_partner_test_1,
+            conversation.message_partner_ids,
+            msg="'Test Partner #1' must be follower",
+        )
+        self.assertFalse(message.author_id, msg="Message must have no author")
+        self.assertEqual(
+            ConversationQueue.search_count([("conversation_id", "=", conversation.id)]),
+            1,
+            msg="Email must be queued",
+        )
+        ConversationQueue._cron_process_queue()
+        self.assertFalse(
+            ConversationQueue.search([("conversation_id", "=", conversation.id)]),
+            msg="Queue must be empty",
+        )
+        sender = ResPartner.search([("email", "=", "deferred.sender@example.com")])
+        receiver = ResPartner.search([("email", "=", "deferred.receiver@example.com")])
+        self.assertTrue(sender, msg="'Sender' partner must be created")
+        self.assertTrue(receiver, msg="'Receiver' partner must be created")
+        self.assertEqual(conversation.author_id, sender, msg="Author must be 'Sender'")
+        self.assertEqual(
+            message.author_id, sender, msg="Message author must be 'Sender'"
+        )
+        partners = sender | receiver | self.res_partner_test_1
+        self.assertEqual(
+            conversation.partner_ids,
+            partners,
+            msg="Participants must be 'Sender', 'Receiver' and 'Test Partner #1'",
+        )
+        self.assertEqual(
+            conversation.message_partner_ids & partners,
+            partners,
+            msg="Participants must be followers",
+        )
+
+    # TEST - 18 : Failed processing of incoming emails is retried
+    def test_conversation_deferred_processing_retry(self):
+        """Failed processing of incoming emails is retried"""
+        ConversationQueue = self.env["cetmix.conversation.queue"]
+        self.env["ir.config_parameter"].sudo().set_param(
+            "cetmix.conversation_deferred_max_attempts", 2
+        )
+        job_failing, job = ConversationQueue.create(
+            [
+                {
+                    "conversation_id": conversation.id,
+                    "email_from": "Sender <deferred.sender@example.com>",
+                }
+                for conversation in (
+                    self.cetmix_conversation_1,
+                    self.cetmix_conversation_2,
+                )
+            ]
+        )
+        process = type(ConversationQueue)._process
+
+        def process_failing(jobs):
+            if job_failing in jobs:
+                raise UserError("Broken email")
+            return process(jobs)
+
+        with patch.object(
+            type(ConversationQueue), "_process", autospec=True
+        ) as process_mock:
+            process_mock.side_effect = process_failing
+            ConversationQueue._cron_process_queue()
+            self.assertFalse(job.exists(), msg="Email must be processed")
+            self.assertEqual(job_failing.state, "pending", msg="Email must be pending")
+            self.assertEqual(
+                job_failing.attempt_count, 1, msg="Attempt count must be equal to 1"
+            )
+            self.assertIn("Broken email", job_failing.error, msg="Error must be stored")
+            ConversationQueue._cron_process_queue()
+            self.assertEqual(job_failing.state, "failed", msg="Email must be failed")
+            self.assertEqual(
+                job_failing.attempt_count, 2, msg="Attempt count must be equal to 2"
+            )
+        job_failing.action_retry()
+        self.assertEqual(job_failing.state, "pending", msg="Email must be pending")
+        self.assertFalse(job_failing.attempt_count, msg="Attempts must be reset")
+        self.assertFalse(job_failing.error, msg="Error must be reset")
+        ConversationQueue._cron_process_queue()
+        self.assertFalse(job_failing.exists(), msg="Queue must be empty")
+
+    # TEST - 19 : Partners found by email are not outdated
+    def test_partner_by_email_cache(self):
+        """Partners found by email are not outdated"""
+        Conversation = self.env["cetmix.conversation"]
+        partner = self.res_partner_test_1
+        self.assertEqual(
+            Conversation.get_or_create_partner_id_by_email(partner.email),
+            partner.id,
+            msg="Partner must be equal to 'Test Partner #1'",
+        )
+        partner.email = "test.partner.new@example.com"
+        self.assertFalse(
+            Conversation._partner_ids_by_emails(["test.partner@example.com"]),
+            msg="Partner must not be found by old email",
+        )
+        partner_count = self.env["res.partner"].search_count([])
+        with patch.object(
+            type(Conversation), "partner_by_email", autospec=True
+        ) as partner_by_email:
+            partner_by_email.return_value = partner
+            self.assertEqual(
+                Conversation.get_or_create_partner_id_by_email(
+                    "unknown.partner@example.com"
+                ),
+                partner.id,
+                msg="Partner must be found by 'partner_by_email'",
+            )
+        self.assertEqual(
+            self.env["res.partner"].search_count([]),
+            partner_count,
+            msg="Partner must not be created",
+        )
+        partner_ids_by_emails = type(Conversation)._partner_ids_by_emails
+        with patch.object(
+            type(Conversation),
+            "_partner_ids_by_emails",
+            autospec=True,
+            side_effect=partner_ids_by_emails,
+        ) as search_partners:
+            Conversation._get_or_create_partner_ids_by_emails(
+                [f"unknown.partner.{index}@example.com" for index in range(3)]
+            )
+        search_partners.assert_called_once()
+
+    # TEST - 20 : Empty trash stops when messages are not deleted
+    def test_unlink_trash_message_not_deleted(self):
+        """Empty trash stops when messages are not deleted"""
+        ICPSudo = self.env["ir.config_parameter"].sudo()
+        ICPSudo.set_param("cetmix.messages_easy_empty_trash", 1)
+        ICPSudo.set_param("cetmix.messages_easy_empty_trash_batch_size", 1)
+        messages = self.mail_message_1 | self.mail_message_2
+        messages.unlink_pro()
+        MailMessage = self.env["mail.message"]
+        with patch.object(
+            type(MailMessage), "unlink_pro", autospec=True
+        ) as unlink_pro, self.assertLogs(
+            "odoo.addons.prt_mail_messages.models.mail_message", level="INFO"
+        ) as logs:
+            MailMessage._unlink_trash_message(
+                test_custom_datetime=fields.Datetime.now()
+            )
+        processed_ids = [
+            message.id for call in unlink_pro.call_args_list for message in call.args[0]
+        ]
+        self.assertEqual(
+            len(processed_ids),
+            len(set(processed_ids)),
+            msg="Each message must be processed once",
+        )
+        self.assertTrue(
+            set(messages.ids) <= set(processed_ids),
+            msg="Trashed messages must be processed",
+        )
+        self.assertEqual(
+            messages.exists(), messages, msg="Messages must not be deleted"
+        )
+        self.assertIn(
+            "Trash purge: 0 messages deleted",
+            logs.output[-1],
+            msg="Messages not deleted must not be counted",
+        )
@@ -0,0 +1,289 @@
+###################################################################################
+#
+#    Copyright (C) 2020 Cetmix OÜ
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU LESSER GENERAL PUBLIC LICENSE as
+#    published by the Free Software Foundation, either version 3 of the
+#    License, or (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU LESSER GENERAL PUBLIC LICENSE for more details.
+#
+#    You should have received a copy of the GNU LESSER GENERAL PUBLIC LICENSE
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+###################################################################################
+
+from unittest.mock import patch
+
+from odoo.fields import Datetime
+from odoo.tests import tagged
+from odoo.tools import SQL
+
+from .common import MailMessageCommon
+
+
+@tagged("post_install", "-at_install")
+class TestMailMessageSearch(MailMessageCommon):
+    """
+    TEST 1 : Keyset pagination
+        - First page is equal to OFFSET search first page
+        [Scroll forward]
+        - Second page is equal to OFFSET search second page
+        [Return from form view]
+        - Second page is returned again
+        [Jump to the last page]
+        - Last page is equal to OFFSET search last page
+        [Scroll back]
+        - Second page is returned again
+        [Jump to the page which is not the last one in pager]
+        - Page is equal to OFFSET search page
+        - Messages are not counted
+
+    TEST 2 : Page refill
+        [Search messages as user without access to conversations]
+        - Page is filled with partner messages only
+        [Scroll forward]
+        - Second page contains remaining partner messages only
+
+    TEST 3 : Forbidden models
+        - Forbidden models contain predefined and transient models
+        - Forbidden models don't contain regular models
+        - Forbidden models are fetched from cache without queries
+
+    TEST 4 : Full-text search
+        - Messages are found by word from body
+        - Messages are found by sender email
+        - Messages are not found by HTML markup
+
+    TEST 5 : Message indexes
+        - Trash query uses trash index
+        - Date query uses date index
+
+    TEST 6 : Forbidden models in all search paths
+        [Post message to forbidden model]
+        - Message is not shown on keyset page
+        - Message is not shown when sorted by date
+        - Message is not shown on page jumped to with OFFSET
+        - Message is not counted
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        MailMessage = cls.env["mail.message"]
+        vals_list = []
+        for index in range(6):
+            vals_list += [
+                {
+                    "author_id": cls.res_partner_bob.id,
+                    "body": f"Test Body Conversation #{index}",
+                    "message_type": "comment",
+                    "res_id": cls.cetmix_conversation_1.id,
+                    "model": "cetmix.conversation",
+                },
+                {
+                    "author_id": cls.res_partner_bob.id,
+                    "body": f"Test Body Partner #{index}",
+                    "message_type": "comment",
+                    "res_id": cls.res_partner_mark.id,
+                    "model": cls.res_partner_mark._name,
+                },
+            ]
+        cls.messages = MailMessage.create(vals_list)
+        cls.messages_partner = cls.messages.filtered(
+            lambda m: m.model == cls.res_partner_mark._name
+        )
+
+    def _search_page(self, offset, limit, previous_page=None, **kwargs):
+        """
+        Search messages the same way Messages Easy List View does
+        :param int offset: page offset
+        :param int limit: page size
+        :param previous_page: mail.message recordset displayed before
+        :return: mail.message recordset
+        """
+        context = {"check_messages_access": True}
+        if previous_page:
+            context.update(
+                first_id=previous_page[0].id,
+                last_id=previous_page[-1].id,
+                last_offset=kwargs.get("last_offset", 0),
+                list_count=kwargs.get("list_count"),
+            )
+        return (
+            self.env["mail.message"]
+            .with_user(kwargs.get("user", self.env.user))
+            .with_context(**context)
+            .search(
+                kwargs.get("domain", [("id", "in", self.messages.ids)]),
+                offset=offset,
+                limit=limit,
+                order=kwargs.get("order", "id desc"),
+            )
+        )
+
+    # -- TEST 1 : Keyset pagination
+    def test_keyset_pagination(self):
+        """Keyset pagination returns the same pages as OFFSET pagination"""
+        MailMessage = self.env["mail.message"]
+        domain = [("id", "in", self.messages.ids)]
+        expected_pages = [
+            MailMessage.search(domain, offset=offset, limit=5, order="id desc")
+            for offset in (0, 5, 10)
+        ]
+        page_1 = self._search_page(0, 5)
+        self.assertEqual(page_1, expected_pages[0], msg="Pages must be equal")
+        page_2 = self._search_page(5, 5, page_1)
+        self.assertEqual(page_2, expected_pages[1], msg="Pages must be equal")
+        self.assertEqual(
+            self._search_page(5, 5, page_2, last_offset=5),
+            expected_pages[1],
+            msg="Pages must be equal",
+        )
+        page_3 = self._search_page(10, 5, page_1, list_count=len(self.messages))
+        self.assertEqual(page_3, expected_pages[2], msg="Pages must be equal")
+        self.assertEqual(
+            self._search_page(5, 5, page_3, last_offset=10),
+            expected_pages[1],
+            msg="Pages must be equal",
+        )
+        with patch.object(
+            type(MailMessage), "_search_messages_count", autospec=True
+        ) as search_messages_count:
+            self.assertEqual(
+                self._search_page(10, 5, page_1, list_count=20),
+                expected_pages[2],
+                msg="Pages must be equal",
+            )
+        search_messages_count.assert_not_called()
+
+    # -- TEST 2 : Page refill
+    def test_page_refill(self):
+        """Pages are refilled with messages user has access to"""
+        messages_partner = self.messages_partner.sorted("id", reverse=True)
+        page_1 = self._search_page(0, 3, user=self.test_user)
+        self.assertEqual(
+            page_1, messages_partner[:3], msg="Page must contain partner messages"
+        )
+        page_2 = self._search_page(3, 3, page_1, user=self.test_user)
+        self.assertEqual(
+            page_2, messages_partner[3:], msg="Page must contain partner messages"
+        )
+
+    # -- TEST 3 : Forbidden models
+    def test_forbidden_models(self):
+        """Forbidden models are computed once and cached in the registry"""
+        MailMessage = self.env["mail.message"]
+        forbidden_models = MailMessage._get_forbidden_models()
+        self.assertIn("mail.message", forbidden_models, msg="Model must be forbidden")
+        self.assertIn(
+            "mail.compose.message", forbidden_models, msg="Model must be forbidden"
+        )
+        self.assertNotIn(
+            "res.partner", forbidden_models, msg="Model must not be forbidden"
+        )
+        with self.assertQueryCount(0):
+            self.assertEqual(
+                MailMessage._get_forbidden_models(),
+                forbidden_models,
+                msg="Forbidden models must be the same",
+            )
+
+    # -- TEST 4 : Full-text search
+    def test_search_text(self):
+        """Messages are found by text in subject, body and sender"""
+        MailMessage = self.env["mail.message"]
+        self.messages[0].write(
+            {"email_from": "sender@example.com", "body": "<p>Quarterly report</p>"}
+        )
+        domain = [("id", "in", self.messages.ids)]
+        self.assertEqual(
+            MailMessage.search(domain + [("search_text", "ilike", "partner")]),
+            self.messages_partner,
+            msg="Partner messages must be found",
+        )
+        self.assertEqual(
+            MailMessage.search(
+                domain + [("search_text", "ilike", "sender@example.com")]
+            ),
+            self.messages[0],
+            msg="Message must be found by sender",
+        )
+        self.assertEqual(
+            MailMessage.search(domain + [("search_text", "ilike", "quarterly")]),
+            self.messages[0],
+            msg="Message must be found by body",
+        )
+        self.assertFalse(
+            MailMessage.search(domain + [("search_text", "ilike", "p")]),
+            msg="Messages must not be found by HTML markup",
+        )
+
+    # -- TEST 5 : Message indexes
+    def test_message_indexes(self):
+        """Hot queries are served by message indexes"""
+        MailMessage = self.env["mail.message"].sudo().with_context(active_test=False)
+        now = Datetime.now()
+        domains = {
+            "mail_message_trash_index": [
+                ("active", "=", False),
+                ("delete_uid", "!=", False),
+                ("delete_date", "<=", now),
+            ],
+            "mail_message_date_brin_index": [("date", ">=", now)],
+        }
+        # Leave bitmap scans only so the primary key cannot be used
+        #  to return rows in 'id' order
+        self.env.cr.execute("SET LOCAL enable_seqscan = off")
+        self.env.cr.execute("SET LOCAL enable_indexscan = off")
+        for index_name, domain in domains.items():
+            query = MailMessage._search(domain)
+            query.order = None
+            self.env.cr.execute(SQL("EXPLAIN %s", query.select()))
+            plan = "\n".join(row[0] for row in self.env.cr.fetchall())
+            self.assertIn(
+                index_name,
+                plan,
+                msg=f"Query for {domain} must use index {index_name}",
+            )
+
+    # -- TEST 6 : Forbidden models in all search paths
+    def test_forbidden_models_search(self):
+        """Messages of forbidden models are excluded from pages and counts"""
+        MailMessage = self.env["mail.message"]
+        forbidden_message = MailMessage.create(
+            {
+                "author_id": self.res_partner_bob.id,
+                "body": "Test Body Forbidden",
+                "message_type": "comment",
+                "res_id": self.messages[0].id,
+                "model": "mail.message",
+            }
+        )
+        messages = self.messages | forbidden_message
+        domain = [("id", "in", messages.ids)]
+        MailMessageCheck = MailMessage.with_context(check_messages_access=True)
+        self.assertNotIn(
+            forbidden_message,
+            self._search_page(0, 20, domain=domain),
+            msg="Message must not be shown on keyset page",
+        )
+        self.assertNotIn(
+            forbidden_message,
+            MailMessageCheck.search(domain, limit=20, order="date desc"),
+            msg="Message must not be shown when sorted by date",
+        )
+        self.assertNotIn(
+            forbidden_message,
+            MailMessageCheck.search(domain, offset=1, limit=20, order="id desc"),
+            msg="Message must not be shown on page jumped to with OFFSET",
+        )
+        self.assertEqual(
+            MailMessageCheck.search_count(domain),
+            len(self.messages),
+            msg="Message must not be counted",
+        )
@@ -0,0 +1,222 @@
+###################################################################################
+#
+#    Copyright (C) 2020 Cetmix OÜ
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU LESSER GENERAL PUBLIC LICENSE as
+#    published by the Free Software Foundation, either version 3 of the
+#    License, or (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU LESSER GENERAL PUBLIC LICENSE for more details.
+#
+#    You should have received a copy of the GNU LESSER GENERAL PUBLIC LICENSE
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+###################################################################################
+
+
+from odoo.tests import tagged
+
+from .common import MailMessageCommon
+
+
+@tagged("post_install", "-at_install")
+class TestMessageInbox(MailMessageCommon):
+    """
+    TEST 1 : Unread messages
+        [Notify current user about two messages]
+        - Inbox rows are unread
+        - Unread filter returns both messages
+        [Mark one message as read]
+        - Unread filter returns other message only
+        [Delete notification]
+        - Inbox row is removed
+
+    TEST 2 : Starred messages
+        [Star two messages]
+        - Inbox rows are starred
+        - Starred filter returns both messages
+        [Unstar one message]
+        - Starred filter returns other message only
+        - Not starred filter does not return other message
+        [Unstar all messages]
+        - Starred filter returns nothing
+
+    TEST 3 : Trashed messages
+        [Star message and move it to trash]
+        - Inbox row is trashed
+        - Starred filter does not return message
+        - Starred filter returns message for inactive messages
+        [Restore message from trash]
+        - Inbox row is not trashed
+
+    TEST 4 : Internal user inbox
+        [Notify internal user about two messages and star one of them]
+        - Unread filter returns both messages for internal user
+        - Starred filter returns starred message for internal user
+        [Remove inbox rows]
+        - Messages Easy Unread filter returns nothing
+        - Discuss Unread filter still returns both messages
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.partner = cls.env.user.partner_id
+        cls.messages = cls.mail_message_test_1 | cls.mail_message_test_conversation
+        cls.MessageInbox = cls.env["cetmix.message.inbox"]
+
+    def _get_inbox(self, messages):
+        """
+        Get inbox rows of current user
+        :param messages: mail.message recordset
+        :return: cetmix.message.inbox recordset
+        """
+        return self.MessageInbox.search(
+            [("partner_id", "=", self.partner.id), ("message_id", "in", messages.ids)]
+        )
+
+    def _search(self, domain, **context):
+        """
+        Search test messages the same way Messages Easy views do
+        :param list domain: search domain
+        :return: mail.message recordset
+        """
+        return (
+            self.env["mail.message"]
+            .with_context(check_messages_access=True, **context)
+            .search([("id", "in", self.messages.ids)] + domain)
+        )
+
+    # -- TEST 1 : Unread messages
+    def test_unread_messages(self):
+        """Unread filter uses inbox rows maintained from notifications"""
+        notifications = self.env["mail.notification"].create(
+            [
+                {
+                    "mail_message_id": message.id,
+                    "res_partner_id": self.partner.id,
+                    "notification_type": "inbox",
+                    "is_read": False,
+                }
+                for message in self.messages
+            ]
+        )
+        inbox = self._get_inbox(self.messages)
+        self.assertEqual(len(inbox), 2, msg="Inbox must contain 2 rows")
+        self.assertFalse(any(inbox.mapped("is_read")), msg="Rows must be unread")
+        self.assertEqual(
+            self._search([("needaction", "=", True)]),
+            self.messages,
+            msg="Both messages must be unread",
+        )
+        self.mail_message_test_1.mark_read_multi()
+        self.assertEqual(
+            self._search([("needaction", "=", True)]),
+            self.mail_message_test_conversation,
+            msg="Only conversation message must be unread",
+        )
+        notifications.filtered(
+            lambda n: n.mail_message_id == self.mail_message_test_1
+        ).unlink()
+        self.assertFalse(
+            self._get_inbox(self.mail_message_test_1),
+            msg="Inbox row must be removed",
+        )
+
+    # -- TEST 2 : Starred messages
+    def test_starred_messages(self):
+        """Starred filter uses inbox rows maintained on star toggle"""
+        self.messages.star_multi()
+        inbox = self._get_inbox(self.messages)
+        self.assertTrue(all(inbox.mapped("is_starred")), msg="Rows must be starred")
+        self.assertEqual(
+            self._search([("starred", "=", True)]),
+            self.messages,
+            msg="Both messages must be starred",
+        )
+        self.mail_message_test_1.star_multi()
+        self.assertEqual(
+            self._search([("starred", "=", True)]),
+            self.mail_message_test_conversation,
+            msg="Only conversation message must be starred",
+        )
+        self.assertEqual(
+            self._search([("starred", "=", False)]),
+            self.mail_message_test_1,
+            msg="Only first message must not be starred",
+        )
+        self.env["mail.message"].unstar_all()
+        self.assertFalse(
+            self._search([("starred", "=", True)]),
+            msg="Messages must not be starred",
+        )
+
+    # -- TEST 3 : Trashed messages
+    def test_trashed_messages(self):
+        """Inbox rows follow trash state of messages"""
+        message = self.mail_message_test_1
+        message.star_multi()
+        message.unlink_pro()
+        self.assertTrue(
+            self._get_inbox(message).is_trashed, msg="Inbox row must be trashed"
+        )
+        self.assertFalse(
+            self._search([("starred", "=", True)]),
+            msg="Trashed message must not be returned",
+        )
+        self.assertEqual(
+            self._search([("starred", "=", True)], active_test=False),
+            message,
+            msg="Trashed message must be returned for inactive messages",
+        )
+        message.undelete()
+        self.assertFalse(
+            self._get_inbox(message).is_trashed, msg="Inbox row must not be trashed"
+        )
+
+    # -- TEST 4 : Internal user inbox
+    def test_internal_user_inbox(self):
+        """Inbox filters work for users without access to inbox table"""
+        user = self.test_user
+        messages = self.mail_message_parent | self.mail_message_test_1
+        self.env["mail.notification"].create(
+            [
+                {
+                    "mail_message_id": message.id,
+                    "res_partner_id": user.partner_id.id,
+                    "notification_type": "inbox",
+                    "is_read": False,
+                }
+                for message in messages
+            ]
+        )
+        messages.with_user(user).star_multi()
+        self.mail_message_parent.with_user(user).star_multi()
+        MailMessage = self.env["mail.message"].with_user(user)
+        domain = [("id", "in", messages.ids)]
+        MailMessageEasy = MailMessage.with_context(check_messages_access=True)
+        self.assertEqual(
+            MailMessageEasy.search(domain + [("needaction", "=", True)]),
+            messages,
+            msg="Both messages must be unread",
+        )
+        self.assertEqual(
+            MailMessageEasy.search(domain + [("starred", "=", True)]),
+            self.mail_message_test_1,
+            msg="Only first message must be starred",
+        )
+        # Discuss does not depend on inbox table
+        self.MessageInbox.search([("message_id", "in", messages.ids)]).unlink()
+        self.assertFalse(
+            MailMessageEasy.search(domain + [("needaction", "=", True)]),
+            msg="Messages Easy must use inbox table",
+        )
+        self.assertEqual(
+            MailMessage.search(domain + [("needaction", "=", True)]),
+            messages,
+            msg="Discuss must use notifications",
+        )
@@ -18,6 +18,7 @@
 ###################################################################################
 
 from odoo import _
+from odoo.exceptions import AccessError
 from odoo.tests import common
 
 
@@ -42,6 +43,13 @@ class TestUserAccessMessage(common.TransactionCase):
         [Add user to conversation #1]
         - user has access to conversation #1
         - user has access to conversation #2
+
+    TEST 5 : Check delete rights
+        [Add group delete to user]
+        - user can delete own comment and email received by user only
+        - user cannot delete comment of another author
+        - user cannot delete email with multiple recipients
+        - user cannot delete email without recipients
     """
 
     def setUp(self):
@@ -184,3 +192,49 @@ class TestUserAccessMessage(common.TransactionCase):
         )
         self.assertTrue(conversation_1)
         self.assertTrue(conversation_2)
+
+    # -- TEST 5 : Check delete rights
+    def test_unlink_rights_check(self):
+        """User can delete own messages only"""
+        self.res_users_test.write(
+            {"groups_id": [(4, self.ref("prt_mail_messages.group_delete"))]}
+        )
+        partner = self.res_users_test.partner_id
+        other_partner = self.env["res.partner"].create({"name": "Other Partner"})
+        message_vals = {"model": partner._name, "res_id": partner.id}
+        (
+            own_comment,
+            other_comment,
+            own_email,
+            shared_email,
+            email,
+        ) = self.MailMessage.create(
+            [
+                dict(message_vals, message_type="comment", author_id=partner.id),
+                dict(
+                    message_vals,
+                    message_type="comment",
+                    author_id=other_partner.id,
+                ),
+                dict(
+                    message_vals,
+                    message_type="email",
+                    partner_ids=[(4, partner.id)],
+                ),
+                dict(
+                    message_vals,
+                    message_type="email",
+                    partner_ids=[(4, partner.id), (4, other_partner.id)],
+                ),
+                dict(message_vals, message_type="email"),
+            ]
+        ).with_user(
+            self.res_users_test
+        )
+        self.assertTrue(
+            (own_comment | own_email).unlink_rights_check(),
+            msg="User must be able to delete messages",
+        )
+        for message in (other_comment, shared_email, email):
+            with self.assertRaises(AccessError):
+                (own_comment | message).unlink_rights_check()
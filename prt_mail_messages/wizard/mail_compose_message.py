@@ -33,12 +33,10 @@ class MailComposer(models.TransientModel):
     def _default_signature_location(self):
         """Set default signature location"""
         return (
-            self.env["ir.config_parameter"]
-            .sudo()
-            .get_param(
-                "cetmix.message_signature_location",
-                DEFAULT_SIGNATURE_LOCATION,
-            )
+            self.env["ir.config_parameter"]._get_cetmix_settings()[
+                "cetmix.message_signature_location"
+            ]
+            or DEFAULT_SIGNATURE_LOCATION
         )
 
     wizard_mode = fields.Selection(
@@ -89,11 +87,9 @@ class MailComposer(models.TransientModel):
         }
         if not is_quote:
             return body
-        quote_number = int(
-            self.env["ir.config_parameter"]
-            .sudo()
-            .get_param("cetmix.message_quote_number", 0)
-        )
+        quote_number = self.env["ir.config_parameter"]._get_cetmix_settings()[
+            "cetmix.message_quote_number"
+        ]
         return self._trim_quote_blocks(body, quote_number)
 
     @api.model